@@ -0,0 +1,471 @@
+"""
+benchmark for hfsstokicad: generates synthetic hfss projects of several sizes, converts them with main
+and stores time, throughput and peak memory of every stage, so results of versions can be compared
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Any, Dict, IO
+
+import hfsstokicad
+
+MB = 1024 * 1024
+
+# folder for generated projects (they are generated once for every size and options)
+default_data_folder = os.path.join(tempfile.gettempdir(), "hfsstokicad-benchmark")
+
+# file with results of all runs, one json record in line
+default_results_file = "benchmark_results.jsonl"
+
+default_sizes = [1, 10, 100, 500]
+
+
+def indent(text: str, depth: int) -> str:
+    """
+    indents every line of text with tabs as in hfss files
+    :param text: lines
+    :param depth: number of tabs
+    :return: indented text with new line at the end
+    """
+    return "".join("\t" * depth + line + "\n" for line in text.split("\n"))
+
+
+HEADER = indent("""$begin 'AnsoftProject'
+\tCreated='Wed Jun 13 10:56:15 2018'
+\tProduct='HFSS'
+\t$begin 'Desktop'
+\t\tVersion(2018, 0)
+\t\tInfrastructureVersion(1, 0)
+\t$end 'Desktop'
+\tUsesAdvancedFeatures=false
+\t$begin 'HFSSModel'
+\t\tRepTypeName='HFSS'
+\t\tName='HFSSDesign1'
+\t\tSolutionType='DrivenModal'
+\t\t$begin 'ModelSetup'
+\t\t\t$begin 'Properties'
+\t\t\t\tVariableProp('W2', 'UD', '', '1.5mm')
+\t\t\t\tVariableProp('Angle', 'UD', '', '30deg')
+\t\t\t$end 'Properties'
+\t\t\t$begin 'GeometryCore'
+\t\t\t\t$begin 'GeometryOperations'
+\t\t\t\t\t$begin 'AnsoftRangedIDServer'
+\t\t\t\t\t\tIDServer=1000
+\t\t\t\t\t$end 'AnsoftRangedIDServer'
+\t\t\t\t\tGeometryEntityListIDs[0:]""", 0)
+
+RECTANGLE = indent("""$begin 'GeometryPart'
+\t$begin 'Attributes'
+\t\tName='Rectangle%(number)d'
+\t\tFlags=''
+\t\tColor='(132 132 193)'
+\t\tTransparency=0
+\t\tMaterialValue='"copper"'
+\t\tSolveInside=false
+\t$end 'Attributes'
+\t$begin 'Operations'
+\t\t$begin 'Operation'
+\t\t\tOperationType='Rectangle'
+\t\t\tID=%(id)d
+\t\t\t$begin 'RectangleParameters'
+\t\t\t\tKernelVersion=4
+\t\t\t\tXStart='%(x0)gmm'
+\t\t\t\tYStart='%(y0)gmm'
+\t\t\t\tZStart='0mm'
+\t\t\t\tWidth='%(width)gmm'
+\t\t\t\tHeight='%(height)gmm'
+\t\t\t\tWhichAxis='Z'
+\t\t\t$end 'RectangleParameters'
+\t\t\tParentPartID=%(id)d
+\t\t\tIsSuppressed=false
+\t\t$end 'Operation'
+\t\t$begin 'Operation'
+\t\t\tOperationType='CoverLines'
+\t\t\tID=%(id)d
+\t\t\tParentPartID=%(id)d
+\t\t\tIsSuppressed=false
+\t\t\t$begin 'OperationIdentity'
+\t\t\t\t$begin 'Topology'
+\t\t\t\t\tNumLumps=1
+\t\t\t\t\tNumShells=1
+\t\t\t\t\tNumFaces=1
+\t\t\t\t$end 'Topology'
+\t\t\t\tBodyID=%(id)d
+\t\t\t\tStartFaceID=-1
+\t\t\t\t$begin 'GeomTopolBasedOperationIdentityHelper'
+\t\t\t\t\t$begin 'NewFaces'
+\t\t\t\t\t\t$begin 'Face'
+\t\t\t\t\t\t\tNormalizedSerialNum=0
+\t\t\t\t\t\t\tID=%(id)d
+\t\t\t\t\t\t\t$begin 'FaceGeomTopol'
+\t\t\t\t\t\t\t\tFaceTopol(1, 4, 4, 4)
+\t\t\t\t\t\t\t\t$begin 'FaceGeometry'
+\t\t\t\t\t\t\t\t\tArea=%(area)g
+\t\t\t\t\t\t\t\t\tFcUVMid(%(xm)g, %(ym)g, 0)
+\t\t\t\t\t\t\t\t\t$begin 'FcTolVts'
+\t\t\t\t\t\t\t\t\t\tTolVt(%(x0)g, %(y0)g, 0, 5e-07)
+\t\t\t\t\t\t\t\t\t\tTolVt(%(x1)g, %(y0)g, 0, 5e-07)
+\t\t\t\t\t\t\t\t\t\tTolVt(%(x1)g, %(y1)g, 0, 5e-07)
+\t\t\t\t\t\t\t\t\t\tTolVt(%(x0)g, %(y1)g, 0, 5e-07)
+\t\t\t\t\t\t\t\t\t$end 'FcTolVts'
+\t\t\t\t\t\t\t\t$end 'FaceGeometry'
+\t\t\t\t\t\t\t$end 'FaceGeomTopol'
+\t\t\t\t\t\t$end 'Face'
+\t\t\t\t\t$end 'NewFaces'
+\t\t\t\t$end 'GeomTopolBasedOperationIdentityHelper'
+\t\t\t\tFacesIDs[1: %(id)d]
+\t\t\t$end 'OperationIdentity'
+\t\t$end 'Operation'
+\t$end 'Operations'
+$end 'GeometryPart'""", 5)
+
+POLYLINE = indent("""$begin 'GeometryPart'
+\t$begin 'Attributes'
+\t\tName='Polyline%(number)d'
+\t\tColor='(143 175 143)'
+\t\tMaterialValue='"copper"'
+\t$end 'Attributes'
+\t$begin 'Operations'
+\t\t$begin 'Operation'
+\t\t\tOperationType='Polyline'
+\t\t\tID=%(id)d
+\t\t\t$begin 'PolylineParameters'
+\t\t\t\tIsPolylineCovered=true
+\t\t\t\tIsPolylineClosed=false
+\t\t\t\t$begin 'PolylinePoints'
+%(points)s\t\t\t\t$end 'PolylinePoints'
+\t\t\t\t$begin 'PolylineSegments'
+%(segments)s\t\t\t\t$end 'PolylineSegments'
+\t\t\t$end 'PolylineParameters'
+\t\t\tParentPartID=%(id)d
+\t\t$end 'Operation'
+\t$end 'Operations'
+$end 'GeometryPart'""", 5)
+
+POINT = indent("""$begin 'PLPoint'
+\tX='%gmm'
+\tY='%gmm'
+\tZ='0mm'
+$end 'PLPoint'""", 9)
+
+LINE = indent("""$begin 'PLSegment'
+\tSegmentType='Line'
+\tStartIndex=%d
+\tNoOfPoints=2
+$end 'PLSegment'""", 9)
+
+ARC = indent("""$begin 'PLSegment'
+\tSegmentType='AngularArc'
+\tStartIndex=%d
+\tNoOfPoints=3
+\tNoOfSegments='0'
+\tArcAngle='%sdeg'
+\tArcCenterX='%gmm'
+\tArcCenterY='%gmm'
+\tArcCenterZ='0mm'
+\tArcPlane='XY'
+$end 'PLSegment'""", 9)
+
+GEOMETRY_END = indent("""\t\t\t\t\t$end 'ToplevelParts'
+\t\t\t\t\t$begin 'OperandParts'
+\t\t\t\t\t$end 'OperandParts'
+\t\t\t\t$end 'GeometryOperations'
+\t\t\t$end 'GeometryCore'
+\t\t$end 'ModelSetup'
+\t\t$begin 'Solutions'""", 0)
+
+SIM_VALUE = indent("""$begin 'SimValue'
+\tID=%d
+\tValues(0.125, -3.5, 12.75, 0.0625, 1e-05, 2.5, -17.25, 0.5)
+\tName='max(dB(S(1,1)))'
+$end 'SimValue'""", 3)
+
+REPORT = indent("""$begin 'Report%d'
+\tReportType='Modal Solution Data'
+\tDisplayType='Rectangular Plot'
+\tTraceDef(Name='dB(S(1,1))', Sweep='LastAdaptive', Points[4: 1, 2, 3, 4])
+$end 'Report%d'""", 3)
+
+PROJECT_END = indent("""\t\t$end 'Solutions'
+\t\t$begin 'ReportSetup'
+\t\t$end 'ReportSetup'
+\t$end 'HFSSModel'
+$end 'AnsoftProject'""", 0)
+
+EMBEDDED_FILE = indent("""$begin 'EmbeddedFile%d'
+\tName='model%d.sab'
+\tData=$begin_cdata$
+%s$end_cdata$
+$end 'EmbeddedFile%d'""", 1)
+
+PREVIEW = indent("""$begin 'ProjectPreview'
+\tThumbnail64='%s'
+$end 'ProjectPreview'""", 0)
+
+BASE64_LINE = "/9j/4AAQSkZJRgABAQEAYABgAAD/2wBDAAgGBgcGBQgHBwcJCQgKDBQNDAsLDBkSEw8UHRofHh0aHBwg\n"
+
+
+@dataclass
+class SyntheticProject:
+    size: int
+    geometry_share: float = 0.02
+    polyline_every: int = 10
+    segments: int = 16
+    arc_share: float = 0.5
+    embedded_share: float = 0
+
+    def filename(self, folder: str) -> str:
+        """
+        :param folder: folder for generated projects
+        :return: file name for project with these options
+        """
+        name = "synthetic_%d_%g_%d_%d_%g" % (self.size, self.geometry_share, self.polyline_every, self.segments,
+                                             self.arc_share)
+        if self.embedded_share:
+            name += "_%g" % self.embedded_share
+        return os.path.join(folder, name + ".hfss")
+
+
+def write_rectangle(f: IO[str], number: int):
+    """
+    writes rectangle part with CoverLines face
+    :param f: file
+    :param number: part number
+    :return:
+    """
+    x0, y0 = number % 100 * 2, number // 100 % 100 * 2
+    x1, y1 = x0 + 1.25, y0 + 0.75
+    f.write(RECTANGLE % dict(number=number, id=number * 10 + 5, x0=x0, y0=y0, x1=x1, y1=y1, width=x1 - x0,
+                             height=y1 - y0, area=(x1 - x0) * (y1 - y0), xm=(x0 + x1) / 2, ym=(y0 + y1) / 2))
+
+
+def write_polyline(f: IO[str], number: int, segments: int, arc_share: float):
+    """
+    writes polyline part with lines and half circle arcs
+    :param f: file
+    :param number: part number
+    :param segments: number of segments
+    :param arc_share: share of arcs in segments
+    :return:
+    """
+    x, y = number % 100 * 2, number // 100 % 100 * 2 + 1
+    points = [POINT % (x, y)]
+    res = []
+    for i in range(segments):
+        start = len(points) - 1
+        if int((i + 1) * arc_share) > int(i * arc_share):
+            sign = 1 if i % 2 else -1
+            res.append(ARC % (start, "%d" % (180 * sign), x + 0.5, y))
+            points.append(POINT % (x + 0.5, y - 0.5 * sign))
+        else:
+            res.append(LINE % start)
+        x += 1
+        points.append(POINT % (x, y))
+    f.write(POLYLINE % dict(number=number, id=number * 10 + 5, points="".join(points), segments="".join(res)))
+
+
+def generate_project(filename: str, project: SyntheticProject):
+    """
+    writes synthetic hfss project: embedded files after project section are about embedded_share of size,
+    geometry parts are about geometry_share of project section, the rest are bulky solutions and reports
+    skipped by converter
+    :param filename: name of new file
+    :param project: project options
+    :return:
+    """
+    temp = filename + ".tmp"
+    size = project.size * (1 - project.embedded_share)
+    with open(temp, "w") as f:
+        f.write(HEADER)
+        f.write(indent("$begin 'ToplevelParts'", 5))
+        number = 0
+        while f.tell() < size * project.geometry_share or number < 2:
+            if number % project.polyline_every == project.polyline_every - 1:
+                write_polyline(f, number, project.segments, project.arc_share)
+            else:
+                write_rectangle(f, number)
+            number += 1
+        f.write(GEOMETRY_END)
+        value = 0
+        while f.tell() < size * (1 + project.geometry_share) / 2:
+            f.write("".join(SIM_VALUE % (value + i) for i in range(100)))
+            value += 100
+        report = 0
+        while f.tell() < size - len(PROJECT_END) - 1000:
+            f.write("".join(REPORT % (report + i, report + i) for i in range(100)))
+            report += 100
+        f.write(PROJECT_END)
+        if project.embedded_share:
+            f.write("$begin 'AllReferencedFilesForProject'\n")
+            number = 0
+            while f.tell() < project.size - 1000:
+                lines = max(1, min(4 * MB, project.size - 1000 - f.tell()) // len(BASE64_LINE))
+                f.write(EMBEDDED_FILE % (number, number, BASE64_LINE * lines, number))
+                number += 1
+            f.write("$end 'AllReferencedFilesForProject'\n")
+        f.write(PREVIEW % ("/9j/4AAQSkZJRgABAQEAYABgAAD" * 32))
+    os.replace(temp, filename)
+
+
+def get_project(folder: str, project: SyntheticProject) -> str:
+    """
+    gets generated project file, generates it if it does not exist
+    :param folder: folder for generated projects
+    :param project: project options
+    :return: file name
+    """
+    filename = project.filename(folder)
+    if not os.path.exists(filename):
+        os.makedirs(folder, exist_ok=True)
+        generate_project(filename, project)
+    return filename
+
+
+def run_benchmark(filename: str, legacy: bool = False, repeat: int = 1) -> Dict[str, Any]:
+    """
+    converts file with main: best time of several runs without profiling, then one run with stage profiling
+    :param filename: name of hfss file
+    :param legacy: use regexp json conversion instead of parser
+    :param repeat: number of runs for time
+    :return: result with time, throughput in MB/s, peak memory and stage statistics
+    """
+    size = os.path.getsize(filename)
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ok = hfsstokicad.main(filename, legacy=legacy)
+            times.append(time.perf_counter() - start)
+        hfsstokicad.set_profiling()
+        try:
+            hfsstokicad.main(filename, legacy=legacy)
+            stages = hfsstokicad.profile_report()
+        finally:
+            hfsstokicad.set_profiling(False)
+    return {"size": size, "legacy": legacy, "ok": ok, "time": min(times), "throughput": size / MB / min(times),
+            "peak": max([s["peak"] for s in stages] + [0]), "stages": stages}
+
+
+def get_version() -> Dict[str, str]:
+    """
+    :return: converter hash and git commit (if available) to identify version
+    """
+    res = {"converter": hfsstokicad.converter_hash()[:12], "commit": None}
+    try:
+        res["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                       cwd=os.path.dirname(os.path.abspath(hfsstokicad.__file__))).stdout.strip()
+    except OSError:
+        pass
+    return res
+
+
+def load_results(filename: str) -> List[Dict[str, Any]]:
+    """
+    :param filename: file with results of runs
+    :return: list of stored runs
+    """
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def store_results(filename: str, record: Dict[str, Any]):
+    """
+    appends run to file with results
+    :param filename: file with results of runs
+    :param record: run
+    :return:
+    """
+    with open(filename, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def find_previous(runs: List[Dict[str, Any]], record: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    finds result of the last stored run with the same options, size and pipeline
+    :param runs: stored runs
+    :param record: current run
+    :param result: current result
+    :return: previous result or None
+    """
+    for run in reversed(runs):
+        if run["options"] == record["options"]:
+            for res in run["results"]:
+                if (res["project"], res["legacy"]) == (result["project"], result["legacy"]):
+                    return res
+    return None
+
+
+def delta(new: float, old: float) -> str:
+    """
+    :return: change in percents
+    """
+    return "%+.1f%%" % ((new - old) / old * 100) if old else ""
+
+
+def print_results(record: Dict[str, Any], runs: List[Dict[str, Any]]):
+    """
+    prints table with results and changes from previous run
+    :param record: current run
+    :param runs: stored runs
+    :return:
+    """
+    print("%8s %-7s %9s %9s %9s %9s %9s" % ("size, MB", "parser", "time, s", "MB/s", "peak, MB", "time", "peak"))
+    for res in record["results"]:
+        previous = find_previous(runs, record, res) or {}
+        print(("%8.1f %-7s %9.3f %9.2f %9.2f %9s %9s" % (
+            res["size"] / MB, "legacy" if res["legacy"] else "new", res["time"], res["throughput"], res["peak"] / MB,
+            delta(res["time"], previous.get("time")), delta(res["peak"], previous.get("peak")))).rstrip())
+        for s in res["stages"]:
+            counts = " ".join("%s=%d" % item for item in s["counts"].items())
+            print(("%8s   %-14s %9.3f %9.2f  %s" % ("", s["name"], s["time"], s["peak"] / MB, counts)).rstrip())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="benchmark of hfsstokicad with synthetic projects")
+    parser.add_argument("--sizes", type=float, nargs="+", default=default_sizes, help="project sizes in MB")
+    parser.add_argument("--legacy", action="store_true", help="benchmark regexp json conversion too (slow)")
+    parser.add_argument("--repeat", type=int, default=1, help="number of runs, the best time is taken")
+    parser.add_argument("--geometry-share", type=float, default=0.02, help="share of geometry parts in project")
+    parser.add_argument("--polyline-every", type=int, default=10, help="every n-th part is polyline")
+    parser.add_argument("--segments", type=int, default=16, help="number of segments in polyline")
+    parser.add_argument("--arc-share", type=float, default=0.5, help="share of arcs in polyline segments")
+    parser.add_argument("--embedded-share", type=float, default=0, help="share of embedded files after project")
+    parser.add_argument("--tolerance", type=float, help="max chord deviation for arcs in mm")
+    parser.add_argument("--max-arc-points", type=int, help="max number of points for one arc")
+    parser.add_argument("--simplify", type=float, help="tolerance in mm for simplification of polygons")
+    parser.add_argument("--data-dir", default=default_data_folder, help="folder for generated projects")
+    parser.add_argument("--results", default=default_results_file, help="file with results of runs")
+    parser.add_argument("--no-store", action="store_true", help="do not store results")
+    args = parser.parse_args()
+    hfsstokicad.set_options(args.tolerance, args.max_arc_points, simplify=args.simplify)
+    record = {"date": datetime.datetime.now().isoformat(timespec="seconds"), "version": get_version(),
+              "python": platform.python_version(), "numpy": getattr(hfsstokicad.np, "__version__", None),
+              "options": {"tolerance": args.tolerance, "max_arc_points": args.max_arc_points, "simplify": args.simplify,
+                          "delta": hfsstokicad.deg_delta},
+              "results": []}
+    for size in args.sizes:
+        project = SyntheticProject(int(size * MB), args.geometry_share, args.polyline_every, args.segments,
+                                   args.arc_share, args.embedded_share)
+        filename = get_project(args.data_dir, project)
+        for legacy in [False, True] if args.legacy else [False]:
+            result = run_benchmark(filename, legacy, args.repeat)
+            result["project"] = asdict(project)
+            record["results"].append(result)
+            print("%s %s: %.3f s" % (os.path.basename(filename), "legacy" if legacy else "new", result["time"]),
+                  file=sys.stderr)
+    runs = load_results(args.results)
+    print_results(record, runs)
+    if not args.no_store:
+        store_results(args.results, record)
+    sys.exit(0 if all(res["ok"] for res in record["results"]) else 1)
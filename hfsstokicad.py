@@ -1,31 +1,78 @@
 import re
 import json
 import sys
-from os import remove
-from dataclasses import dataclass
-from typing import List, Any, Dict, Tuple
+import argparse
+import os
+import io
+from dataclasses import dataclass, field, asdict
+from typing import List, Any, Dict, Tuple, Iterable, Iterator, Callable, NamedTuple, Optional, Set
+from array import array
 import math
-
-# doubled hssf elements (should be replaced with Element0..EleemntN to validate json file)
-doubled = {"MoveBackwards", "VariableProp", "AnsoftRangedIDServer", "Operation", "TolVt", "GeometryPart",
-           "PLSegment", 'Edge', "DependencyObject", "PLPoint", "DependencyInformation", "GeometryPosition", "Range",
-           "Sweep", "Solution", "SimValue", "Soln", "TraceComponentDefinition", "TraceDef", "MainMapItem", "SubMapItem",
-           "ListItem", "IDMapItem", "Graph2D"}
+import time
+import uuid
+import glob
+import hashlib
+import shutil
+import functools
+import contextlib
+import tracemalloc
+import mmap
+import bisect
+import fnmatch
+import ast
+import csv
+import asyncio
+import signal
+import base64
+import threading
+import urllib.parse
+from http import HTTPStatus
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# extensions of project files
+project_extensions = {".hfss", ".aedt"}
+
+# folder for converted files cache
+default_cache_folder = os.environ.get("HFSSTOKICAD_CACHE",
+                                      os.path.join(os.path.expanduser("~"), ".cache", "hfsstokicad"))
 
 # PCB elements excluded for result
 exclude_names = {"Port", "Top", "Bottom"}
 
 deg_delta = 0.1
 
+# max chord deviation from arc in mm (None: arcs are made with deg_delta steps)
+chord_tolerance = None
 
-@dataclass
-class Point:
-    x: float
-    y: float
+# max number of points for one arc (None: not limited)
+max_arc_points = None
 
+# max step for arc made with chord_tolerance in degrees
+max_step_angle = 90
 
-@dataclass
-class Arc:
+# designs converted to footprints (name patterns, None: all designs), every design gives own footprint
+design_patterns = None
+
+# parts used for footprints (name patterns, None: all parts except excluded)
+part_patterns = None
+
+# every selected part gives own footprint
+split_parts = False
+
+# tolerance in mm for removing of repeated and collinear points and merging of touching rectangles, None: off
+simplify_tolerance = None
+
+# blocks used for footprint, parse_project skips the others (solutions, reports, preview, etc.)
+geometry_blocks = ['AnsoftProject/HFSSModel/ModelSetup/GeometryCore/GeometryOperations',
+                   'AnsoftProject/HFSSModel/ModelSetup/Properties']
+
+
+class Arc(NamedTuple):
     number_of_point: int
     startindex: int
     type: str
@@ -35,100 +82,515 @@ class Arc:
     numberofsegments: int = 0
 
 
-def prepare_json(text: str) -> str:
+class PathPoint:
     """
-    function makes first changes in whole source file:
-    begin -> {, end -> }, ' -> ", removes quotes,  screens #
-    function removes tabulations and deletes project preview block
-    :param text: whole text
-    :return: text corrected
+    point of Path, reads and writes coordinates in path array
     """
+    __slots__ = ('path', 'offset')
 
-    # rule0: remove files part
-    i = text.find(r"$end 'AnsoftProject'")
-    text = text[: i + len(r"$end 'AnsoftProject'")]
-    text += '\n'
+    def __init__(self, path: 'Path', index: int):
+        self.path = path
+        self.offset = index * path.dims
 
-    # rule1: remove tabulations
-    text = re.sub(r"\t", "", text)
+    @property
+    def x(self) -> float:
+        return self.path.coords[self.offset]
 
-    # rule2: remove doubled quotes
-    text = re.sub('\'\"|\"\'', r'"', text)
+    @x.setter
+    def x(self, value: float):
+        self.path.coords[self.offset] = value
 
-    # rule3 change quotes ' -> "
-    text = re.sub(r"'", r'"', text)
+    @property
+    def y(self) -> float:
+        return self.path.coords[self.offset + 1]
 
-    # rule4: $begin "Attribute" -> "Attribute":{
-    templ = re.compile(r'\$begin "([\w| ]*)"\n')
-    text = templ.sub(r'"\1":{\n', text)
+    @y.setter
+    def y(self, value: float):
+        self.path.coords[self.offset + 1] = value
 
-    # rule5: $end "Attribute" -> }
-    text = re.sub(r'\$end \"?[\w\s]*\"\n', "},\n", text)
+    def __len__(self) -> int:
+        return self.path.dims
 
-    # rule6 screens # symbol
-    templ = re.compile(r'#([\w]+)')
-    text = templ.sub(r'"\1"', text)
+    def __getitem__(self, index: int) -> float:
+        if not -self.path.dims <= index < self.path.dims:
+            raise IndexError("point index out of range")
+        return self.path.coords[self.offset + index % self.path.dims]
 
-    # rule7 function()) -> 'function<text>)' (if no spaces)
-    templ = re.compile(r'(\w*)\(( *)\)\)')
-    text = templ.sub(r'"\1<\2>")', text)
+    def __iter__(self) -> Iterator[float]:
+        return iter(self.path.coords[self.offset:self.offset + self.path.dims])
 
-    return text
+    def __eq__(self, other: Any) -> bool:
+        return list(self) == list(other)
 
+    def __repr__(self) -> str:
+        return "PathPoint(%s)" % ", ".join(map(repr, self))
 
-def data_correct(text: str) -> str:
+
+class Path:
     """
-    some text corrections for hssf
-    :param text:
+    points of polyline or polygon in one array('d'): x0, y0, x1, y1...
+    points can have more than two coordinates (dims), for example four for TolVt
+    """
+    __slots__ = ('coords', 'dims')
+
+    def __init__(self, coords: Iterable[float] = (), dims: int = 2):
+        self.coords = array('d', coords)
+        self.dims = dims
+
+    @classmethod
+    def from_array(cls, points: 'np.ndarray') -> 'Path':
+        """
+        :param points: numpy array with shape (N, dims)
+        :return: path with copy of array data
+        """
+        path = cls(dims=points.shape[1] if points.ndim == 2 else 2)
+        path.coords.frombytes(np.ascontiguousarray(points, dtype=float).tobytes())
+        return path
+
+    def as_array(self) -> 'np.ndarray':
+        """
+        :return: numpy array with shape (N, dims) sharing memory with path
+        """
+        return np.frombuffer(self.coords, dtype=float).reshape(-1, self.dims)
+
+    def __len__(self) -> int:
+        return len(self.coords) // self.dims
+
+    def __getitem__(self, index: int) -> PathPoint:
+        if not -len(self) <= index < len(self):
+            raise IndexError("path index out of range")
+        return PathPoint(self, index % len(self))
+
+    def __iter__(self) -> Iterator[PathPoint]:
+        return (PathPoint(self, i) for i in range(len(self)))
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Path) and self.dims == other.dims and self.coords == other.coords
+
+    def __repr__(self) -> str:
+        return "Path(%s, dims=%d)" % (self.coords.tolist(), self.dims)
+
+    def append(self, *coords: float):
+        """
+        adds point
+        :param coords: coordinates of point (x, y for 2d path)
+        """
+        self.coords.extend(coords)
+
+    def columns(self, i: int, j: int) -> 'Path':
+        """
+        :param i: index of coordinate used as x
+        :param j: index of coordinate used as y
+        :return: 2d path with selected coordinates of every point
+        """
+        path = Path()
+        if self.dims == 2 and (i, j) == (0, 1):
+            path.coords = array('d', self.coords)
+        elif np is not None:
+            path.coords.frombytes(self.as_array()[:, [i, j]].tobytes())
+        else:
+            path.coords.extend(c for point in self for c in (point[i], point[j]))
+        return path
+
+    def mirrored(self, signed_zero: bool = True) -> 'Path':
+        """
+        gets path mirrored over y axis, x coordinates are negated with one operation
+        :param signed_zero: x is replaced with -x (0 becomes -0 as in polylines) or with 0 - x (as in rectangles)
+        :return: new path
+        """
+        path = Path(dims=self.dims)
+        if np is not None:
+            points = self.as_array().copy()
+            points[:, 0] = -points[:, 0] if signed_zero else 0 - points[:, 0]
+            path.coords.frombytes(points.tobytes())
+        else:
+            path.coords = array('d', self.coords)
+            xs = self.coords[::self.dims]
+            path.coords[::self.dims] = array('d', [-x for x in xs] if signed_zero else [0 - x for x in xs])
+        return path
+
+
+class Repeated(list):
+    """
+    values of attribute met several times in one block (in file order)
+    """
+
+
+def add_item(node: Dict[str, Any], key: str, value: Any):
+    """
+    adds attribute to block, repeated attributes are collected to Repeated list
+    :param node: block dict
+    :param key: attribute name
+    :param value: attribute value
     :return:
     """
+    if key in node:
+        old = node[key]
+        if isinstance(old, Repeated):
+            old.append(value)
+        else:
+            node[key] = Repeated([old, value])
+    else:
+        node[key] = value
 
-    # rule8 '. ' -> "" (remove dor with space)
-    text = text.replace(". ", "")
 
-    # rule9 '[value: value]' -> 'value-value for Level strings'
-    if 'Level' in text:
-        templ = re.compile(r'\[(-?\d+\.?\d*): (-?\d+\.?\d*)]')
-        text = templ.sub(r'\1-\2', text)
+def collect_pairs(pairs: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    """
+    object_pairs_hook for json.loads: keeps repeated keys as Repeated list
+    :param pairs: json object pairs
+    :return: dict
+    """
+    res: Dict[str, Any] = dict()
+    for key, value in pairs:
+        add_item(res, key, value)
+    return res
 
-    # rule10 ": " -> ", "
-    text = re.sub("[^ ]: ", ", ", text)
 
-    # rule11 '(R=R1, G=G1, B=B1) - > ({R=R1}, {G=G1}, {B=B1})'
-    if 'Color' in text:
-        templ = re.compile(r'\(R=(\d+), G=(\d+), B=(\d+)\)')
-        text = templ.sub(r'({"R": \1}, {"G": \2}, {"B": \3})', text)
+def items_of(node: Dict[str, Any], key: str) -> List[Any]:
+    """
+    gets all values of attribute in block
+    :param node: block dict
+    :param key: attribute name
+    :return: list of values (empty if no attribute)
+    """
+    value = node.get(key)
+    if value is None:
+        return []
+    if isinstance(value, Repeated):
+        return value
+    return [value]
 
-    # rule12 '[, ' -> [
-    text = text.replace(r'[, ', '[')
 
-    # rule13: special rule for strings like Name='max(dB(S(1,1)))'
-    templ = re.compile(r'\(?(d?B?)\(?[SZ]\(1[,;]1\)\)?\)?')
-    text = templ.sub(r'<\1<S<1.1>>>', text)
+@dataclass
+class Rule:
+    """
+    text correction rule for json conversion:
+    pattern (regexp or plain text) is replaced with replacement, handler is used instead for special rules
+    rule is checked only for strings containing all guard substrings (plain text pattern is guard itself)
+    final rule stops string handling if string was changed
+    calls, hits and time are statistics: number of strings checked, number of strings changed, time spent
+    """
+    name: str
+    pattern: str
+    replacement: str = ''
+    guard: Tuple[str, ...] = ()
+    regexp: bool = True
+    handler: Callable[['Rule', str], str] = None
+    final: bool = False
+    calls: int = 0
+    hits: int = 0
+    time: float = 0
+
+    def __post_init__(self):
+        self.compiled = re.compile(self.pattern) if self.regexp else None
+        if not self.regexp and not self.guard:
+            self.guard = (self.pattern,)
+
+    def apply(self, text: str) -> str:
+        """
+        applies rule to text
+        :param text: text to correct
+        :return: corrected text
+        """
+        for substring in self.guard:
+            if substring not in text:
+                return text
+        self.calls += 1
+        start = time.perf_counter()
+        if self.handler is not None:
+            res = self.handler(self, text)
+        elif self.compiled is not None:
+            res = self.compiled.sub(self.replacement, text)
+        else:
+            res = text.replace(self.pattern, self.replacement)
+        self.time += time.perf_counter() - start
+        if res != text:
+            self.hits += 1
+        return res
 
-    # rule14: special rule for db(S(1, 1))
-    templ = re.compile(r'dB\(([^\)]*)\(([^\)]*)\)\)')
-    text = templ.sub(r'db<\1<\2>>', text)
 
-    # rule15: special rule for theta-rho-phi(0)
-    if "theta-rho-phi(0)" in text:
-        text = text.replace("(0)", "<0>")
+def apply_rules(rules: List[Rule], text: str) -> str:
+    """
+    applies rules to text one by one
+    :param rules: list of rules
+    :param text: text to correct
+    :return: corrected text
+    """
+    for rule in rules:
+        res = rule.apply(text)
+        if rule.final and res != text:
+            return res
+        text = res
+    return text
 
-    # rule16: fix SimVAlueID parameter
-    if "SimValueID" in text:
-        text = text.replace("SimValueID=", "\"SimValueID\", ")
 
-    # rule17 handle special words $begin_data and $end_data
-    templ = re.compile(r"\$begin_cdata\$(.)*?\$end_cdata\$")
-    text = templ.sub(r'"start_data \1end_data"', text)
+def pairs_rule(rule: Rule, text: str) -> str:
+    """
+    handler for rule21: (id=value, id1 = value1) -> ("id"->"value", "id1"->"value1")
+    rule is applied twice for every bracket group in text
+    :param rule: rule with id=value pattern
+    :param text: text to correct
+    :return: corrected text
+    """
+    for _ in range(2 * len(brackets_re.findall(text))):
+        res = rule.compiled.sub(rule.replacement, text)
+        if res == text:
+            break
+        text = res
+    return text
+
+
+def attribute_rule(rule: Rule, text: str) -> str:
+    """
+    handler for rule22: blabala attribute(text)  -> blabbla {"attribute":{"text"}}
+                        attribute(text)  -> "attribute":{"text"}
+    :param rule: rule with attribute(text) pattern
+    :param text: text to correct
+    :return: corrected text
+    """
+    res = rule.compiled.search(text)
+    if res is None:
+        return text
+    if res.start() == 0:
+        return rule.compiled.sub(r'"\1":{\2:\3},', text)
+    return rule.compiled.sub(r'{"\1":{\2:\3}}', text)
+
+
+brackets_re = re.compile(r'([\w ]+)\(([^\)]*)\)')
+
+modeler_re = re.compile(r'("3D Modeler")(.*)')
+
+# rules for whole text used by prepare_json
+text_rules = [
+    # rule1: remove tabulations
+    Rule('rule1', '\t', '', regexp=False),
+    # rule2: remove doubled quotes
+    Rule('rule2', '\'\"|\"\'', r'"'),
+    # rule3 change quotes ' -> "
+    Rule('rule3', "'", '"', regexp=False),
+    # rule4: $begin "Attribute" -> "Attribute":{
+    Rule('rule4', r'\$begin "([\w| ]*)"\n', r'"\1":{\n', guard=('$begin',)),
+    # rule5: $end "Attribute" -> }
+    Rule('rule5', r'\$end \"?[\w\s]*\"\n', "},\n", guard=('$end',)),
+    # rule6 screens # symbol
+    Rule('rule6', r'#([\w]+)', r'"\1"', guard=('#',)),
+    # rule7 function()) -> 'function<text>)' (if no spaces)
+    Rule('rule7', r'(\w*)\(( *)\)\)', r'"\1<\2>")', guard=('))',)),
+]
 
+# rules for every string used by data_correct
+data_rules = [
+    # rule8 '. ' -> "" (remove dor with space)
+    Rule('rule8', '. ', '', regexp=False),
+    # rule9 '[value: value]' -> 'value-value for Level strings'
+    Rule('rule9', r'\[(-?\d+\.?\d*): (-?\d+\.?\d*)]', r'\1-\2', guard=('Level', ': ')),
+    # rule10 ": " -> ", "
+    Rule('rule10', '[^ ]: ', ', ', guard=(': ',)),
+    # rule11 '(R=R1, G=G1, B=B1) - > ({R=R1}, {G=G1}, {B=B1})'
+    Rule('rule11', r'\(R=(\d+), G=(\d+), B=(\d+)\)', r'({"R": \1}, {"G": \2}, {"B": \3})', guard=('Color', '(R=')),
+    # rule12 '[, ' -> [
+    Rule('rule12', '[, ', '[', regexp=False),
+    # rule13: special rule for strings like Name='max(dB(S(1,1)))'
+    Rule('rule13', r'\(?(d?B?)\(?[SZ]\(1[,;]1\)\)?\)?', r'<\1<S<1.1>>>', guard=('(1',)),
+    # rule14: special rule for db(S(1, 1))
+    Rule('rule14', r'dB\(([^\)]*)\(([^\)]*)\)\)', r'db<\1<\2>>', guard=('dB(',)),
+    # rule15: special rule for theta-rho-phi(0)
+    Rule('rule15', '(0)', '<0>', guard=('theta-rho-phi(0)',), regexp=False),
+    # rule16: fix SimVAlueID parameter
+    Rule('rule16', 'SimValueID=', '"SimValueID", ', regexp=False),
+    # rule17 handle special words $begin_data and $end_data
+    Rule('rule17', r"\$begin_cdata\$(.)*?\$end_cdata\$", r'"start_data \1end_data"',
+         guard=('$begin_cdata$', '$end_cdata$')),
     # rule18 for Height()
-    if 'Height' in text and 'if' in text:
-        text = text.replace('(', '<')
-        text = text.replace(')', '>')
-        text = text.replace(',', ';')
+    Rule('rule18(', '(', '<', guard=('Height', 'if'), regexp=False),
+    Rule('rule18)', ')', '>', guard=('Height', 'if'), regexp=False),
+    Rule('rule18,', ',', ';', guard=('Height', 'if'), regexp=False),
+]
+
+# rules for every string used by string_handler after data_correct
+string_rules = [
+    # rule19: comma in the middle of text (without space) becomes ;
+    Rule('rule19', r',([^ ])', r';\1', guard=(',',)),
+    # rule20: attribute=value(data) -> 'attribute':'value(data)'
+    Rule('rule20', r'"?(\w+)"?="?(\w+)\((\w+)\)"?', r'"\1":"\2(\3)",', guard=('=', '('), final=True),
+    # rule21: (id=value, id1 = value1) -> ("id"->"value", "id1"->"value1")
+    Rule('rule21', r'"?([\w-]+)"?="?([^,\)"])*"?', r'"\1":"\2"', guard=('(', ')', '='), handler=pairs_rule),
+    # rule22 blabala attribute(text)  -> blabbla {"attribute":{"text"}}
+    #      attribute(text)  -> "attribute":{"text"}
+    Rule('rule22', r'"?([\w]+)"?\(([\w "-]+):([^\)]+)\)', guard=('(', ':', ')'), handler=attribute_rule),
+    # rule 23: Attribute="value" -> "Attribute":"value",
+    #          Attribute=value -> "Attribute":value,
+    #          "Attribute"=value -> "Attribute":value,
+    #          Attribute = value, -> "Attribute":value
+    Rule('rule23', r'"?([\w +-]*)"? ?= ?("?[^,]*"?),? ?', r'"\1":\2,', guard=('=',)),
+    # rule 24: Attribute[value] -> "Attribute":"[value]" (without " in [])
+    Rule('rule24', r'"?([\w ]+)"?(\[[^\]\"]*\])', r'"\1":"\2",', guard=('[', ']')),
+    # rule 25: Attribute[...] -> "Attribute":[...],
+    Rule('rule25', r'"?([\w ]+)"?\[([^\]]*)\]', r'"\1":[\2],', guard=('[', ']')),
+    # rule 26: Attribute(values) -> "Attribute":[values],
+    #        "Attribute"(values) -> "Attribute":[values],
+    Rule('rule26', r'"?([\w ]+)"?\((.*)\)', r'"\1":[\2],', guard=('(', ')')),
+    # rule27: remove extra commas
+    Rule('rule27', ',,', ',', regexp=False),
+]
+
+
+def reset_rule_stats():
+    """
+    clears statistics of all rules
+    :return:
+    """
+    for rule in text_rules + data_rules + string_rules:
+        rule.calls = rule.hits = 0
+        rule.time = 0
+
+
+def print_rule_stats():
+    """
+    prints statistics of all rules: strings checked, strings changed and time spent
+    :return:
+    """
+    print("%-8s %10s %10s %10s" % ("rule", "checked", "changed", "time, s"))
+    for rule in text_rules + data_rules + string_rules:
+        print("%-8s %10d %10d %10.3f" % (rule.name, rule.calls, rule.hits, rule.time))
+
+
+# collect time, peak memory and item counts of conversion stages
+profiling = False
+
+
+@dataclass
+class Stage:
+    name: str
+    calls: int = 0
+    time: float = 0
+    peak: int = 0
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, **counts: int):
+        """
+        adds numbers of items processed in stage
+        :param counts: numbers of items, for example lines=10
+        :return:
+        """
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+
+# statistics of stages in order of first call
+stages: Dict[str, Stage] = dict()
 
-    return text
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[Stage]:
+    """
+    measures wall time and peak memory (above memory used before) of code block if profiling is on,
+    stages must not be nested
+    :param name: stage name
+    :return: stage statistics to add counts
+    """
+    if not profiling:
+        yield Stage(name)
+        return
+    res = stages.setdefault(name, Stage(name))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield res
+    finally:
+        res.time += time.perf_counter() - start
+        res.calls += 1
+        res.peak = max(res.peak, tracemalloc.get_traced_memory()[1] - memory)
+
+
+def count_lines(lines: Iterable[str], res: Stage) -> Iterator[str]:
+    """
+    passes lines through and counts them in stage statistics
+    :param lines: lines
+    :param res: stage
+    :return: the same lines
+    """
+    res.count(lines=0)
+    for line in lines:
+        res.counts['lines'] += 1
+        yield line
+
+
+def set_profiling(enabled: bool = True):
+    """
+    switches stage profiling on or off (memory is traced with tracemalloc while profiling is on),
+    clears stage statistics
+    :param enabled: True to collect statistics
+    :return:
+    """
+    global profiling
+    profiling = enabled
+    stages.clear()
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def profile_report() -> List[Dict[str, Any]]:
+    """
+    :return: stage statistics as json compatible list
+    """
+    return [asdict(s) for s in stages.values()]
+
+
+def add_profile(report: List[Dict[str, Any]]):
+    """
+    adds statistics from profile_report (for example from other process) to stage statistics
+    :param report: list of stage statistics
+    :return:
+    """
+    for item in report:
+        res = stages.setdefault(item['name'], Stage(item['name']))
+        res.calls += item['calls']
+        res.time += item['time']
+        res.peak = max(res.peak, item['peak'])
+        res.count(**item['counts'])
+
+
+def print_profile():
+    """
+    prints statistics of stages: calls, time, peak memory and numbers of items
+    :return:
+    """
+    print("%-14s %6s %10s %10s  %s" % ("stage", "calls", "time, s", "peak, MB", "items"))
+    for s in stages.values():
+        counts = " ".join("%s=%d" % item for item in s.counts.items())
+        print(("%-14s %6d %10.3f %10.2f  %s" % (s.name, s.calls, s.time, s.peak / 1024 / 1024, counts)).rstrip())
+    print("%-14s %6s %10.3f %10.2f" % ("total", "", sum(s.time for s in stages.values()),
+                                       max([s.peak for s in stages.values()] + [0]) / 1024 / 1024))
+
+
+def prepare_json(text: str) -> str:
+    """
+    function makes first changes in whole source file:
+    begin -> {, end -> }, ' -> ", removes quotes,  screens #
+    function removes tabulations and deletes project preview block
+    :param text: whole text
+    :return: text corrected
+    """
+
+    # rule0: remove files part (read_project_text does it without decoding for files and bytes)
+    i = text.find(r"$end 'AnsoftProject'")
+    text = text[: i + len(r"$end 'AnsoftProject'")]
+    text += '\n'
+
+    return apply_rules(text_rules, text)
+
+
+def data_correct(text: str) -> str:
+    """
+    some text corrections for hssf
+    :param text:
+    :return:
+    """
+    return apply_rules(data_rules, text)
 
 
 def special_rules(text: str) -> str:
@@ -138,8 +600,7 @@ def special_rules(text: str) -> str:
     :return: corrected string
     """
     if "3D Modeler" in text:
-        templ = re.compile(r'("3D Modeler")(.*)')
-        temp = templ.sub(r'\2', text)
+        temp = modeler_re.sub(r'\2', text)
         temp = temp.replace(r'"', r'\"')
         return r'"3D Modeler":"' + temp + r'",'
 
@@ -179,237 +640,973 @@ def string_handler(text: str) -> str:
         return temp
 
     text = data_correct(text)
+    return apply_rules(string_rules, text)
 
-    # rule19: comma in the middle of text (without space) becomes ;
-    templ = re.compile(r',([^ ])')
-    text = templ.sub(r';\1', text)
 
-    # rule20: attribute=value(data) -> 'attribute':'value(data)'
-    templ = re.compile(r'"?(\w+)"?="?(\w+)\((\w+)\)"?')
-    temp = templ.sub(r'"\1":"\2(\3)",', text)
-    if temp != text:
-        return temp
+def create_first_json(text: str) -> str:
+    """
+    converts whole hfss text to pre-json text with prepare_json and string_handler rules
+    :param text: whole text
+    :return: pre-json text
+    """
+    with stage("prepare_json"):
+        text = prepare_json(text)
+    with stage("string_handler") as res:
+        lines = text.split('\n')
+        res.count(lines=len(lines))
+        return '{' + ''.join(string_handler(s) + '\n' for s in lines) + '}'
 
-    # rule21: (id=value, id1 = value1) -> ("id"->"value", "id1"->"value1")
-    templ = re.compile(r'([\w ]+)\(([^\)]*)\)')
-    res = templ.findall(text)
-    for r in res:
-        templ2 = re.compile(r'"?([\w-]+)"?="?([^,\)"])*"?')
-        for data in r:
-            text = templ2.sub(r'"\1":"\2"', text)
 
-    # rule22 blabala attribute(text)  -> blabbla {"attribute":{"text"}}
-    #      attribute(text)  -> "attribute":{"text"}
-    templ = re.compile(r'"?([\w]+)"?\(([\w "-]+):([^\)]+)\)')
-    res = templ.search(text)
-    if res is not None:
-        if res.start() == 0:
-            text = templ.sub(r'"\1":{\2:\3},', text)
-        else:
-            text = templ.sub(r'{"\1":{\2:\3}}', text)
+def create_second_json(text: str) -> str:
+    """
+    this function changes },} to }} in pre-json text created with create_first_json function
+    :param text: pre-json text
+    :return: json text
+    """
+    with stage("second_json"):
+        return re.sub(',\n*}', '}', text)
 
-    # rule 23: Attribute="value" -> "Attribute":"value",
-    #          Attribute=value -> "Attribute":value,
-    #          "Attribute"=value -> "Attribute":value,
-    #          Attribute = value, -> "Attribute":value
-    templ = re.compile(r'"?([\w +-]*)"? ?= ?("?[^,]*"?),? ?')
-    text = templ.sub(r'"\1":\2,', text)
 
-    # rule 24: Attribute[value] -> "Attribute":"[value]" (without " in [])
-    templ = re.compile(r'"?([\w ]+)"?(\[[^\]\"]*\])')
-    text = templ.sub(r'"\1":"\2",', text)
+# tokens of hfss line: 'quoted string', punctuation or bare word (number, bool, identifier)
+token_re = re.compile(r"'((?:[^'\\]|\\.)*)'|([=()\[\],:])|([^\s'=()\[\],:]+)")
 
-    # rule 25: Attribute[...] -> "Attribute":[...],
-    templ = re.compile(r'"?([\w ]+)"?\[([^\]]*)\]')
-    text = templ.sub(r'"\1":[\2],', text)
+# fast path for the most common line shape: Attribute='value' or Attribute=value
+simple_entry_re = re.compile(r"([\w ]+)=(?:'([^'\\]*)'|([^\s'=()\[\],:]+))$")
 
-    # rule 26: Attribute(values) -> "Attribute":[values],
-    #        "Attribute"(values) -> "Attribute":[values],
-    templ = re.compile(r'"?([\w ]+)"?\((.*)\)')
-    text = templ.sub(r'"\1":[\2],', text)
+closing_tokens = {')', ']'}
 
-    # rule27: remove extra commas
-    text = re.sub(",,", ",", text)
 
-    return text
+def word_value(word: str) -> Any:
+    """
+    converts bare hfss word to python value
+    :param word: word without quotes
+    :return: bool, int, float or the word itself
+    """
+    if word == 'true':
+        return True
+    if word == 'false':
+        return False
+    if word[0] in '0123456789-+.':
+        try:
+            return int(word)
+        except ValueError:
+            pass
+        try:
+            return float(word)
+        except ValueError:
+            pass
+    return word
 
 
-def create_first_json(filename: str):
-    f = open(filename, encoding='utf-8', errors='ignore')
-    text = f.read()
-    f.close()
-    text = prepare_json(text)
-    g = open(filename.split('.')[0] + '.json', "w", encoding='utf-8', errors='ignore')
-    g.write('{')
-    text = text.split('\n')
-    for s in text:
-        s = string_handler(s)
-        g.write(s + '\n')
-    g.write('}')
-    g.close()
-    return
+def tokenize_line(text: str) -> List[Tuple[str, Any]]:
+    """
+    splits hfss line to tokens
+    :param text: line without leading spaces
+    :return: list of (kind, value) pairs, kind is 's' for string, 'w' for word or punctuation symbol itself
+    """
+    tokens = []
+    for m in token_re.finditer(text):
+        string, punct, word = m.groups()
+        if string is not None:
+            tokens.append(('s', string.replace("\\'", "'")))
+        elif punct is not None:
+            tokens.append((punct, punct))
+        else:
+            tokens.append(('w', word))
+    return tokens
 
 
-def replace_with_count(text: str) -> str:
+def parse_value(tokens: List[Tuple[str, Any]], pos: int) -> Tuple[Any, int]:
     """
-    adds numeric counter to attributes from "doubled" list
-    :param text: file content
-    :return: corrected fole content
+    parses one value: string, word, list, arguments or nested function call
+    :param tokens: line tokens
+    :param pos: position of value
+    :return: value and position after it
     """
-
-    for word in doubled:
-        i = 0
-        templ = '\"' + word + '\"'
-        while templ in text:
-            text = text.replace(word + '\"', word + str(i) + '\"', 1)
-            i += 1
-    return text
+    if pos >= len(tokens):
+        return '', pos
+    kind, value = tokens[pos]
+    if kind == 's':
+        return value, pos + 1
+    if kind == 'w':
+        if pos + 1 < len(tokens) and tokens[pos + 1][0] == '(':
+            args, pos = parse_args(tokens, pos + 2)
+            return {value: args}, pos
+        return word_value(value), pos + 1
+    if kind == '(':
+        return parse_args(tokens, pos + 1)
+    if kind == '[':
+        return parse_list(tokens, pos + 1)
+    return '', pos
+
+
+def parse_args(tokens: List[Tuple[str, Any]], pos: int) -> Tuple[Any, int]:
+    """
+    parses arguments up to closing bracket: (a, b, name=value)
+    :param tokens: line tokens
+    :param pos: position after opening bracket
+    :return: list of arguments (dict if all arguments are named) and position after closing bracket
+    """
+    args: List[Any] = []
+    named = 0
+    n = len(tokens)
+    while pos < n:
+        kind = tokens[pos][0]
+        if kind in closing_tokens:
+            pos += 1
+            break
+        if kind == ',' or kind == ':' or kind == '=':
+            pos += 1
+            continue
+        if (kind == 'w' or kind == 's') and pos + 1 < n and tokens[pos + 1][0] == '=':
+            key = tokens[pos][1]
+            value, pos = parse_value(tokens, pos + 2)
+            args.append({key: value})
+            named += 1
+            continue
+        value, pos = parse_value(tokens, pos)
+        args.append(value)
+    if named and named == len(args):
+        res: Dict[str, Any] = dict()
+        for arg in args:
+            res.update(arg)
+        return res, pos
+    return args, pos
+
+
+def parse_list(tokens: List[Tuple[str, Any]], pos: int) -> Tuple[List[Any], int]:
+    """
+    parses hfss list [count: a, b, c]
+    :param tokens: line tokens
+    :param pos: position after [
+    :return: list of values and position after ]
+    """
+    if pos + 1 < len(tokens) and tokens[pos][0] == 'w' and tokens[pos + 1][0] == ':':
+        pos += 2
+    values, pos = parse_args(tokens, pos)
+    if isinstance(values, dict):
+        values = [values]
+    return values, pos
 
 
-def create_second_json(filename: str):
+def parse_entries(text: str) -> List[Tuple[str, Any]]:
     """
-    this function adds numeric endings to attributes name from "doubled" list and
-    changes },} to }} in pre-json file created with create_first_json function
-    :param filename: name of json file
-    :return:
+    parses hfss line with attributes:
+    Attribute=value, Attribute(values), Attribute[count: values]
+    :param text: line without leading spaces
+    :return: list of (attribute, value) pairs
     """
-    g = open(filename + '.json', encoding='utf-8', errors='ignore')
-    text = g.read()
-    text = replace_with_count(text)
-    text = re.sub(',\n*}', '}', text)
-    g.close()
-    g = open(filename + '.json', "w", encoding='utf-8')
-    g.write(text)
-    g.close()
+    m = simple_entry_re.match(text)
+    if m is not None:
+        string, word = m.group(2, 3)
+        return [(m.group(1), string if string is not None else word_value(word))]
+    tokens = tokenize_line(text)
+    res = []
+    pos = 0
+    n = len(tokens)
+    while pos < n:
+        kind, key = tokens[pos]
+        if kind != 'w' and kind != 's' or pos + 1 >= n:
+            pos += 1
+            continue
+        next_kind = tokens[pos + 1][0]
+        if next_kind == '=':
+            value, pos = parse_value(tokens, pos + 2)
+        elif next_kind == '(':
+            value, pos = parse_args(tokens, pos + 2)
+        elif next_kind == '[':
+            value, pos = parse_list(tokens, pos + 2)
+        else:
+            pos += 1
+            continue
+        res.append((key, value))
+    return res
 
 
-def get_variables(data: Dict[str, Any]):
+def block_name(text: str) -> str:
     """
-    gets variables list for data given
-    :param data: data
-    :return: dict with variables
+    gets block name from $begin 'Name' or $end 'Name' line
+    :param text: line without leading spaces
+    :return: block name
     """
-    res: Dict[str, Any] = dict()
-    for key in data:
-        res[data[key][0]] = data[key][3].replace("mm", "")
-        try:
-            res[data[key][0]] = float(res[data[key][0]])
-        except ValueError:
-            pass
-    return res
+    return text[text.index(' ') + 1:].strip().strip("'\"")
 
 
-def create_coord_dict(data: Dict[str, Any], res: Dict[int, List[str]]) -> Dict[int, List[str]]:
+def skip_block(lines: Iterator[str]):
     """
-    function gets list of rectangle coordinates from dict sctucture with data
-    :param data: dict with file data
-    :param res: dict to add data
-    :return: new dict with data
+    reads lines up to the end of current block without parsing them
+    :param lines: lines iterator positioned after $begin line
+    :return:
     """
-    for key in data.keys():
-        name = data[key]['Attributes']['Name']
-        if name not in exclude_names:
-            operations = data[key]['Operations']
-            for operation in operations.keys():
-                if operations[operation]['OperationType'] == 'CoverLines':
-                    faces = operations[operation]['OperationIdentity']['GeomTopolBasedOperationIdentityHelper'][
-                        'NewFaces']
-                    points = faces['Face']['FaceGeomTopol']['FaceGeometry']['FcTolVts']
-                    point_array = []
-                    for point in points.keys():
-                        point_array.append(points[point])
-                    res[int(key[12:])] = point_array
-    return res
+    depth = 1
+    for line in lines:
+        if '$' not in line:
+            continue
+        if '$begin_cdata$' in line:
+            while '$end_cdata$' not in line:
+                line = next(lines, '$end_cdata$')
+            continue
+        text = line.lstrip()
+        if text.startswith('$begin '):
+            depth += 1
+        elif text.startswith('$end '):
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def parse_project(lines: Iterable[str], blocks: Iterable[str] = None) -> Dict[str, Any]:
+    """
+    builds dict tree from hfss file lines in one pass:
+    $begin 'Name' ... $end 'Name' blocks become nested dicts, attributes become dict items,
+    repeated attributes are collected to Repeated lists
+    parsing stops at $end 'AnsoftProject' (files and preview part are ignored)
+    :param lines: lines of hfss file
+    :param blocks: paths of blocks to parse like 'AnsoftProject/HFSSModel/ModelSetup/Properties',
+    other blocks are skipped (only attributes of their parent blocks are kept), None to parse everything
+    :return: dict with file data
+    """
+    selected = prefixes = None
+    if blocks is not None:
+        selected = {tuple(block.split('/')) for block in blocks}
+        prefixes = {path[:i] for path in selected for i in range(1, len(path))}
+    # depth of selected block being parsed (everything inside is parsed)
+    selected_depth = None if selected is not None else 0
+    root: Dict[str, Any] = dict()
+    stack = [root]
+    path: List[str] = []
+    lines = iter(lines)
+    for line in lines:
+        text = line.strip()
+        if not text:
+            continue
+        if text.startswith('$begin '):
+            name = block_name(text)
+            if selected_depth is None:
+                block = tuple(path) + (name,)
+                if block in selected:
+                    selected_depth = len(path)
+                elif block not in prefixes:
+                    skip_block(lines)
+                    continue
+            node: Dict[str, Any] = dict()
+            add_item(stack[-1], name, node)
+            stack.append(node)
+            path.append(name)
+            continue
+        if text.startswith('$end '):
+            if len(stack) > 1:
+                stack.pop()
+                path.pop()
+            if selected is not None and selected_depth == len(path):
+                selected_depth = None
+            if len(stack) == 1 and block_name(text) == 'AnsoftProject':
+                break
+            continue
+        if '$begin_cdata$' in text:
+            while '$end_cdata$' not in text:
+                line = next(lines, None)
+                if line is None:
+                    break
+                text += '\n' + line.rstrip('\n')
+        for key, value in parse_entries(text):
+            add_item(stack[-1], key, value)
+    return root
+
+
+def read_source(source: Any) -> Iterable[str]:
+    """
+    opens hfss data for reading line by line
+    :param source: file name, bytes with file content or file object (text or binary)
+    :return: iterable of lines
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.StringIO(source.decode('utf-8', errors='ignore'))
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, encoding='utf-8', errors='ignore')
+    if isinstance(source, io.TextIOBase):
+        return source
+    return io.TextIOWrapper(source, encoding='utf-8', errors='ignore')
 
 
-def add_parameters_value(parameters: Dict[str, Any], points: List[Point]):
+def close_source(source: Any, f: Iterable[str]):
     """
-    custom function for parametrical parameters, change it for every antenna
-    :param parameters: list of variables
-    :param points: list of points
+    closes file opened by read_source, file object given by caller stays open
+    :param source: source given to read_source
+    :param f: object returned by read_source
     :return:
     """
-    angle_rad = float(parameters['Angle'].replace("deg", "")) / 180 * math.pi
-    points[0].x = float(parameters['X02'][:4]) + parameters['W2']
-    points[0].y = parameters['Y02'] - 0.2
-    points[8].x = parameters['Y20'] - (parameters['Y22'] * math.cos(angle_rad) -
-                                       parameters['X22'] * math.sin(angle_rad))
-    points[8].y = parameters['X20'] - parameters['X22'] * math.cos(angle_rad) - parameters['Y22'] * math.sin(angle_rad)
-    points[15].x = float(parameters['X02'][:4]) + parameters['W2']
-    points[15].y = parameters['Y02'] - 0.2
+    if isinstance(source, (str, os.PathLike, bytes, bytearray)):
+        f.close()
+    elif f is not source:
+        f.detach()
 
 
-def get_arc_data(data: Dict[str, Any], parameters: Dict[str, Any]) -> Tuple[List[Arc], List[Point]]:
+def source_name(source: Any) -> str:
     """
-    create list with angle data
-    :param parameters: list of variables
-    :param data: dict with data
-    :return:list of arc data
+    gets footprint name for source: file name without extension
+    :param source: file name, bytes or file object
+    :return: name
     """
-    res_arcs: List[Arc] = list()
-    res_points: List[Point] = list()
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', None)
+    if isinstance(name, (str, os.PathLike)):
+        return os.path.splitext(os.fspath(name))[0]
+    return 'footprint'
+
+
+def load_project(source: Any, blocks: Iterable[str] = None) -> Dict[str, Any]:
+    """
+    reads hfss data line by line and parses it with parse_project
+    :param source: file name, bytes with file content or file object
+    :param blocks: paths of blocks to parse, None to parse everything
+    :return: dict with file data
+    """
+    f = read_source(source)
+    try:
+        with stage("parse") as res:
+            return parse_project(count_lines(f, res) if profiling else f, blocks)
+    finally:
+        close_source(source, f)
+
+
+def find_cdata(buffer: Any) -> List[Tuple[int, int]]:
+    """
+    finds $begin_cdata$ ... $end_cdata$ parts, markers inside them are not blocks
+    :param buffer: bytes or mmap with file data
+    :return: sorted list of (start, stop) offsets
+    """
+    res = []
+    pos = buffer.find(b"$begin_cdata$")
+    while pos >= 0:
+        stop = buffer.find(b"$end_cdata$", pos)
+        stop = len(buffer) if stop < 0 else stop + len(b"$end_cdata$")
+        res.append((pos, stop))
+        pos = buffer.find(b"$begin_cdata$", stop)
+    return res
+
+
+def cdata_stop(cdata: List[Tuple[int, int]], pos: int) -> int:
+    """
+    :param cdata: list from find_cdata
+    :param pos: offset
+    :return: end of cdata part with pos or -1 if pos is not in cdata
+    """
+    i = bisect.bisect_right(cdata, (pos, math.inf)) - 1
+    if i >= 0 and cdata[i][0] <= pos < cdata[i][1]:
+        return cdata[i][1]
+    return -1
+
+
+def find_block_end(buffer: Any, name: bytes, pos: int, stop: int, cdata: List[Tuple[int, int]] = ()) -> int:
+    """
+    finds $end line of block by byte markers (nested blocks with the same name and cdata are skipped)
+    :param buffer: bytes or mmap with file data
+    :param name: block name
+    :param pos: offset after $begin line of block
+    :param stop: offset where search stops
+    :param cdata: cdata parts from find_cdata
+    :return: offset of $end marker or stop if block is not closed
+    """
+    begin = b"$begin '" + name + b"'"
+    end = b"$end '" + name + b"'"
+    depth = 1
+    while True:
+        e = buffer.find(end, pos, stop)
+        if e < 0:
+            return stop
+        b = buffer.find(begin, pos, e)
+        found = b if b >= 0 else e
+        skip = cdata_stop(cdata, found) if cdata else -1
+        if skip >= 0:
+            pos = skip
+        elif b >= 0:
+            depth += 1
+            pos = b + len(begin)
+        else:
+            depth -= 1
+            if depth == 0:
+                return e
+            pos = e + len(end)
+
+
+class LazyBlock:
+    """
+    block of hfss file: child blocks are found by byte offsets when they are needed,
+    block data is parsed only when it is decoded
+    """
+    __slots__ = ('project', 'name', 'begin', 'start', 'end', 'stop', 'children')
+
+    def __init__(self, project: 'LazyProject', name: str, begin: int, start: int, end: int, stop: int):
+        """
+        :param project: project with file data
+        :param name: block name
+        :param begin: offset of $begin marker
+        :param start: offset after $begin line
+        :param end: offset of $end marker
+        :param stop: offset after $end line
+        """
+        self.project = project
+        self.name = name
+        self.begin = begin
+        self.start = start
+        self.end = end
+        self.stop = stop
+        self.children: List[LazyBlock] = None
+
+    def __repr__(self) -> str:
+        return "LazyBlock(%r, %d, %d)" % (self.name, self.start, self.end)
+
+    def blocks(self, name: str = None) -> List['LazyBlock']:
+        """
+        gets child blocks, offsets are found in the first call
+        :param name: name of blocks, None for all blocks
+        :return: list of blocks in file order
+        """
+        if self.children is None:
+            self.children = []
+            buffer = self.project.buffer
+            cdata = self.project.cdata
+            pos = self.start
+            while True:
+                b = buffer.find(b"$begin '", pos, self.end)
+                if b < 0:
+                    break
+                skip = cdata_stop(cdata, b) if cdata else -1
+                if skip >= 0:
+                    pos = skip
+                    continue
+                quote = buffer.find(b"'", b + len(b"$begin '"), self.end)
+                if quote < 0:
+                    break
+                block_name = buffer[b + len(b"$begin '"):quote]
+                start = buffer.find(b"\n", quote, self.end) + 1 or self.end
+                end = find_block_end(buffer, block_name, start, self.end, cdata)
+                pos = buffer.find(b"\n", end, self.end) + 1 or self.end
+                self.children.append(LazyBlock(self.project, block_name.decode('utf-8', errors='ignore'),
+                                               b, start, end, pos))
+            self.project.blocks_found += len(self.children)
+        if name is None:
+            return self.children
+        return [block for block in self.children if block.name == name]
+
+    def block(self, path: str) -> 'LazyBlock':
+        """
+        gets block by path (the first one for repeated blocks)
+        :param path: names of blocks, for example 'HFSSModel/ModelSetup/Properties'
+        :return: block
+        """
+        block = self
+        for name in path.split('/'):
+            found = block.blocks(name)
+            if not found:
+                raise KeyError(name)
+            block = found[0]
+        return block
+
+    def get(self, path: str) -> Dict[str, Any]:
+        """
+        decodes block by path
+        :param path: names of blocks, for example 'HFSSModel/ModelSetup/Properties'
+        :return: dict with block data
+        """
+        return self.block(path).decode()
+
+    def lines(self, start: int, end: int) -> List[str]:
+        """
+        :return: decoded lines of file part
+        """
+        lines = self.project.buffer[start:end].decode('utf-8', errors='ignore').split('\n')
+        self.project.lines_decoded += len(lines)
+        return lines
+
+    def decode(self) -> Dict[str, Any]:
+        """
+        parses all data of block
+        :return: dict with block data as from parse_project
+        """
+        return parse_project(self.lines(self.start, self.end))
+
+    def attributes(self) -> Dict[str, Any]:
+        """
+        parses attributes of block without child blocks
+        :return: dict with attributes
+        """
+        lines = []
+        pos = self.start
+        for block in self.blocks():
+            lines.extend(self.lines(pos, block.begin))
+            pos = block.stop
+        lines.extend(self.lines(pos, self.end))
+        return parse_project(lines)
+
+    def select(self, paths: Iterable[str]) -> Dict[str, Any]:
+        """
+        decodes selected blocks and attributes of their parent blocks
+        :param paths: paths of blocks like 'AnsoftProject/HFSSModel/ModelSetup/Properties'
+        :return: dict with the same data as parse_project with blocks
+        """
+        selected = {tuple(path.split('/')) for path in paths}
+        return self.select_paths(selected, ())
+
+    def select_paths(self, selected: set, path: Tuple[str, ...]) -> Dict[str, Any]:
+        """
+        :param selected: paths of selected blocks as tuples of names
+        :param path: path of this block
+        :return: attributes of this block with selected child blocks
+        """
+        res = self.attributes()
+        for block in self.blocks():
+            block_path = path + (block.name,)
+            if block_path in selected:
+                add_item(res, block.name, block.decode())
+            elif any(p[:len(block_path)] == block_path for p in selected):
+                add_item(res, block.name, block.select_paths(selected, block_path))
+        return res
+
+
+class LazyProject(LazyBlock):
+    """
+    whole hfss file mapped to memory (mmap for files), blocks are found and decoded on demand:
+    project.get('AnsoftProject/HFSSModel/ModelSetup/Properties') parses only this block,
+    file objects are read to memory whole (load_project streams them)
+    """
+    __slots__ = ('buffer', 'file', 'cdata', 'blocks_found', 'lines_decoded')
+
+    def __init__(self, source: Any):
+        """
+        :param source: file name, bytes with file content or file object
+        """
+        self.file = None
+        if isinstance(source, (bytes, bytearray)):
+            self.buffer = source
+        elif isinstance(source, (str, os.PathLike)):
+            self.file = open(source, 'rb')
+            try:
+                self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file can not be mapped
+                self.buffer = b''
+        else:
+            data = source.read()
+            self.buffer = data.encode('utf-8') if isinstance(data, str) else data
+        self.cdata = find_cdata(self.buffer)
+        self.blocks_found = 0
+        self.lines_decoded = 0
+        super().__init__(self, '', 0, 0, len(self.buffer), len(self.buffer))
+
+    def close(self):
+        """
+        closes mapped file
+        :return:
+        """
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self) -> 'LazyProject':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# end of project section, embedded files and preview after it are not used
+project_end = b"$end 'AnsoftProject'"
+
+
+def project_section(buffer: Any) -> str:
+    """
+    decodes file data up to the end of project section without copying the rest
+    :param buffer: bytes or mmap with file data
+    :return: text of project section (whole text if there is no end of project)
+    """
+    i = buffer.find(project_end)
+    stop = len(buffer) if i < 0 else i + len(project_end)
+    with memoryview(buffer)[:stop] as view:
+        return str(view, 'utf-8', 'ignore')
+
+
+def read_project_text(source: Any) -> str:
+    """
+    reads text of hfss data for json conversion: files are mapped to memory and scanned as bytes,
+    so embedded files and preview after project section are not decoded
+    :param source: file name, bytes with file content or file object
+    :return: text (project section for files and bytes)
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return project_section(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file can not be mapped
+                return ''
+            with buffer:
+                text = project_section(buffer)
+        # the same new lines as in file opened in text mode
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+    f = read_source(source)
     try:
-        for geometry_part in data.keys():
-            operations = data[geometry_part]['Operations']
-            for key in operations:
-                if operations[key]['OperationType'] == 'Polyline':
-                    arcs = operations[key]['PolylineParameters']['PolylineSegments']
-                    for segment in arcs.keys():
-                        if arcs[segment]['SegmentType'] == 'AngularArc':
+        return f.read()
+    finally:
+        close_source(source, f)
+
+
+def load_project_json(source: Any) -> Dict[str, Any]:
+    """
+    old way to get file data: converts hfss text to json with regexp rules and loads it
+    :param source: file name, bytes with file content or file object
+    :return: dict with file data
+    """
+    with stage("read") as stats:
+        text = read_project_text(source)
+        stats.count(chars=len(text))
+    text = create_second_json(create_first_json(text))
+    with stage("json.loads"):
+        return json.loads(text, object_pairs_hook=collect_pairs)
+
+
+def get_variables(data: Dict[str, Any]):
+    """
+    gets variables list for data given
+    :param data: data
+    :return: dict with variables
+    """
+    return {name: parameter_value(value) for name, value in get_variable_expressions(data).items()}
+
+
+def get_variable_expressions(data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    :param data: Properties block of design
+    :return: dict with variable names and value expressions like '1.5mm' or 'W2*2'
+    """
+    return {prop[0]: prop[3] for prop in items_of(data, 'VariableProp')}
+
+
+def parameter_value(value: str) -> Any:
+    """
+    :param value: variable value
+    :return: value in mm as float if it is a number or string without mm
+    """
+    value = value.replace("mm", "")
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# units of expressions, lengths are converted to mm, angles to degrees
+unit_factors = {'nm': 1e-6, 'um': 1e-3, 'mm': 1, 'cm': 10, 'meter': 1000, 'mil': 0.0254, 'in': 25.4,
+                'deg': 1, 'rad': 180 / math.pi}
+
+angle_units = ('deg', 'rad')
+
+number_unit = re.compile(r"((?<![\w.])(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*(%s)\b" % "|".join(unit_factors))
+
+# functions of expressions, angles are in degrees
+expression_functions: Dict[str, Callable[..., float]] = {
+    'sin': lambda a: math.sin(math.radians(a)), 'cos': lambda a: math.cos(math.radians(a)),
+    'tan': lambda a: math.tan(math.radians(a)), 'asin': lambda v: math.degrees(math.asin(v)),
+    'acos': lambda v: math.degrees(math.acos(v)), 'atan': lambda v: math.degrees(math.atan(v)),
+    'atan2': lambda y, x: math.degrees(math.atan2(y, x)), 'sqrt': math.sqrt, 'abs': abs, 'exp': math.exp,
+    'ln': math.log, 'log10': math.log10, 'pow': math.pow, 'min': min, 'max': max}
+
+expression_constants = {'pi': math.pi, 'e': math.e}
+
+expression_operators: Dict[type, Callable[..., float]] = {
+    ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b, ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b, ast.Pow: math.pow, ast.Mod: math.fmod,
+    ast.USub: lambda a: -a, ast.UAdd: lambda a: a}
+
+
+class ExpressionError(ValueError):
+    """
+    expression can not be parsed or evaluated
+    """
+
+
+class Expression:
+    """
+    hfss expression like '2*W2 + 0.5mm' or '-Angle' parsed once, numbers with units are converted
+    to mm and degrees, names are variables, constants (pi, e) and functions (sin, sqrt, ...)
+    """
+    __slots__ = ('text', 'tree', 'names')
+
+    def __init__(self, text: str):
+        self.text = text
+        source = number_unit.sub(lambda m: "(%s*%r)" % (m.group(1), unit_factors[m.group(2)]), text)
+        source = source.replace("^", "**").strip()
+        try:
+            self.tree = ast.parse(source, mode='eval').body
+        except SyntaxError:
+            raise ExpressionError("wrong expression: %s" % text)
+        self.names = {node.id for node in ast.walk(self.tree) if isinstance(node, ast.Name)
+                      and node.id not in expression_functions and node.id not in expression_constants}
+
+    def __call__(self, variables: Dict[str, float]) -> float:
+        """
+        :param variables: values of variables in mm and degrees
+        :return: value in mm or degrees
+        """
+        try:
+            return float(self.evaluate(self.tree, variables))
+        except ExpressionError:
+            raise
+        except (ValueError, TypeError, ArithmeticError) as e:
+            raise ExpressionError("%s: %s" % (self.text, e))
+
+    def evaluate(self, node: ast.AST, variables: Dict[str, float]) -> float:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in variables:
+                return variables[node.id]
+            if node.id in expression_constants:
+                return expression_constants[node.id]
+            raise KeyError(node.id)
+        if isinstance(node, ast.BinOp) and type(node.op) in expression_operators:
+            return expression_operators[type(node.op)](self.evaluate(node.left, variables),
+                                                       self.evaluate(node.right, variables))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in expression_operators:
+            return expression_operators[type(node.op)](self.evaluate(node.operand, variables))
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in expression_functions
+                and not node.keywords):
+            return expression_functions[node.func.id](*(self.evaluate(arg, variables) for arg in node.args))
+        raise ExpressionError("wrong expression: %s" % self.text)
+
+
+def evaluate_variables(expressions: Dict[str, str]) -> Dict[str, float]:
+    """
+    evaluates variables, variables can use other variables
+    :param expressions: dict with variable names and expressions
+    :return: dict with values of variables in mm and degrees, variables that can not be evaluated are skipped
+    """
+    res: Dict[str, float] = dict()
+    failed = set()
+
+    def value(name: str) -> float:
+        if name in res:
+            return res[name]
+        if name in failed or name not in expressions:
+            raise KeyError(name)
+        failed.add(name)
+        expression = Expression(expressions[name])
+        res[name] = expression({n: value(n) for n in expression.names})
+        failed.discard(name)
+        return res[name]
+
+    for variable in expressions:
+        try:
+            value(variable)
+        except (ValueError, KeyError, ArithmeticError):
+            failed.add(variable)
+    return res
+
+
+def angle_variables(expressions: Dict[str, str]) -> Set[str]:
+    """
+    finds variables with angle values: expressions with deg or rad numbers or with other angle variables
+    :param expressions: dict with variable names and expressions
+    :return: names of angle variables
+    """
+    names = dict()
+    res = set()
+    for variable, text in expressions.items():
+        if any(m.group(2) in angle_units for m in number_unit.finditer(text)):
+            res.add(variable)
+        else:
+            try:
+                names[variable] = Expression(text).names
+            except ExpressionError:
+                pass
+    found = True
+    while found:
+        found = [variable for variable, used in names.items() if variable not in res and used & res]
+        res.update(found)
+    return res
+
+
+def match_name(name: str, patterns: Iterable[str] = None) -> bool:
+    """
+    :param name: design or part name
+    :param patterns: name patterns like 'Rectangle*' or None
+    :return: True if name matches one of patterns (or patterns are None)
+    """
+    return patterns is None or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def create_coord_dict(data: Dict[str, Any], res: Dict[int, Path],
+                      parts: Callable[[str], bool] = None) -> Dict[int, Path]:
+    """
+    function gets list of rectangle coordinates from dict sctucture with data
+    :param data: dict with file data
+    :param res: dict to add data, keys are numbers of geometry parts in file order
+    :param parts: filter for part names or None for all parts
+    :return: new dict with data
+    """
+    start = max(res.keys(), default=-1) + 1
+    for number, part in enumerate(items_of(data, 'GeometryPart'), start):
+        name = part['Attributes']['Name']
+        if name not in exclude_names and (parts is None or parts(name)):
+            for operation in items_of(part['Operations'], 'Operation'):
+                if operation['OperationType'] == 'CoverLines':
+                    faces = operation['OperationIdentity']['GeomTopolBasedOperationIdentityHelper']['NewFaces']
+                    face = items_of(faces, 'Face')[-1]
+                    points = face['FaceGeomTopol']['FaceGeometry']['FcTolVts']
+                    vertices = items_of(points, 'TolVt')
+                    res[number] = Path((c for vertex in vertices for c in vertex), dims=len(vertices[0]))
+    return res
+
+
+def add_parameters_value(parameters: Dict[str, Any], points: Path):
+    """
+    custom function for parametrical parameters, change it for every antenna
+    :param parameters: list of variables
+    :param points: list of points
+    :return:
+    """
+    angle_rad = float(parameters['Angle'].replace("deg", "")) / 180 * math.pi
+    points[0].x = float(parameters['X02'][:4]) + parameters['W2']
+    points[0].y = parameters['Y02'] - 0.2
+    points[8].x = parameters['Y20'] - (parameters['Y22'] * math.cos(angle_rad) -
+                                       parameters['X22'] * math.sin(angle_rad))
+    points[8].y = parameters['X20'] - parameters['X22'] * math.cos(angle_rad) - parameters['Y22'] * math.sin(angle_rad)
+    points[15].x = float(parameters['X02'][:4]) + parameters['W2']
+    points[15].y = parameters['Y02'] - 0.2
+
+
+# function changing parametric points of polylines (parameters, points), None: points are taken as is
+parameters_hook = add_parameters_value
+
+
+def get_arc_data(data: Dict[str, Any], parameters: Dict[str, Any],
+                 parts: Callable[[str], bool] = None) -> Tuple[List[Arc], Path]:
+    """
+    create list with angle data, start indexes of arcs are indexes in points of all selected polylines,
+    parameters_hook changes points of all polylines (its indexes are indexes in all points), so selected parts
+    are the same as in footprint of all parts
+    :param parameters: list of variables
+    :param data: dict with data
+    :param parts: filter for part names or None for all parts
+    :return:list of arc data
+    """
+    res_arcs: List[Arc] = list()
+    res_points = Path()
+    # ranges of points of selected polylines in res_points
+    selected: List[Tuple[int, int]] = []
+    try:
+        for geometry_part in items_of(data, 'GeometryPart'):
+            used = parts is None or parts(geometry_part['Attributes']['Name'])
+            for operation in items_of(geometry_part['Operations'], 'Operation'):
+                if operation['OperationType'] == 'Polyline':
+                    offset = sum(stop - start for start, stop in selected)
+                    start = len(res_points)
+                    for segment in items_of(operation['PolylineParameters']['PolylineSegments'], 'PLSegment'):
+                        if not used:
+                            continue
+                        if segment['SegmentType'] == 'AngularArc':
                             try:
-                                res_arcs.append(Arc(startindex=arcs[segment]['StartIndex'],
-                                                    number_of_point=arcs[segment]['NoOfPoints'],
-                                                    numberofsegments=int(arcs[segment]['NoOfSegments']),
-                                                    angle=float(arcs[segment]['ArcAngle'].replace("deg", "")),
-                                                    center_x=float(arcs[segment]['ArcCenterX'].replace('mm', "")),
-                                                    center_y=float(arcs[segment]['ArcCenterY'].replace('mm', "")),
+                                res_arcs.append(Arc(startindex=segment['StartIndex'] + offset,
+                                                    number_of_point=segment['NoOfPoints'],
+                                                    numberofsegments=int(segment['NoOfSegments']),
+                                                    angle=float(segment['ArcAngle'].replace("deg", "")),
+                                                    center_x=float(segment['ArcCenterX'].replace('mm', "")),
+                                                    center_y=float(segment['ArcCenterY'].replace('mm', "")),
                                                     type="arc"))
                             except ValueError:
-                                angle = -float(parameters['Angle'].replace("deg", "")) if "-" in arcs[segment][
-                                    'ArcAngle'] \
+                                angle = -float(parameters['Angle'].replace("deg", "")) if "-" in segment['ArcAngle'] \
                                     else float(parameters['Angle'].replace("deg", ""))
-                                res_arcs.append(Arc(startindex=arcs[segment]['StartIndex'],
-                                                    number_of_point=arcs[segment]['NoOfPoints'],
-                                                    numberofsegments=int(arcs[segment]['NoOfSegments']),
+                                res_arcs.append(Arc(startindex=segment['StartIndex'] + offset,
+                                                    number_of_point=segment['NoOfPoints'],
+                                                    numberofsegments=int(segment['NoOfSegments']),
                                                     angle=angle,
-                                                    center_x=float(arcs[segment]['ArcCenterX'].replace('mm', "")),
-                                                    center_y=float(arcs[segment]['ArcCenterY'].replace('mm', "")),
+                                                    center_x=float(segment['ArcCenterX'].replace('mm', "")),
+                                                    center_y=float(segment['ArcCenterY'].replace('mm', "")),
                                                     type="arc"))
-                        if arcs[segment]['SegmentType'] == 'Line':
+                        if segment['SegmentType'] == 'Line':
                             res_arcs.append(Arc(type="line",
-                                                startindex=arcs[segment]['StartIndex'],
-                                                number_of_point=arcs[segment]['NoOfPoints']))
-                    points = operations[key]['PolylineParameters']['PolylinePoints']
-                    for point in points.keys():
+                                                startindex=segment['StartIndex'] + offset,
+                                                number_of_point=segment['NoOfPoints']))
+                    for point in items_of(operation['PolylineParameters']['PolylinePoints'], 'PLPoint'):
                         try:
-                            res_points.append(Point(x=float(points[point]['X'].replace("mm", "")),
-                                                    y=float(points[point]['Y'].replace("mm", ""))))
+                            x, y = float(point['X'].replace("mm", "")), float(point['Y'].replace("mm", ""))
                         except ValueError:
-                            res_points.append(Point(x=0, y=0))
-        add_parameters_value(parameters, res_points)
+                            x, y = 0, 0
+                        res_points.append(x, y)
+                    if used:
+                        selected.append((start, len(res_points)))
+        if parameters_hook is not None:
+            parameters_hook(parameters, res_points)
     except KeyError:
         pass
-    return res_arcs, res_points
+    if parts is None:
+        return res_arcs, res_points
+    points = Path()
+    for start, stop in selected:
+        points.coords.extend(res_points.coords[2 * start:2 * stop])
+    return res_arcs, points
 
 
-def get_coordinates(filename: str):
+def get_designs(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
-    function opens json file, converts to dict and gets coordinates of rectangles using special dictionary path
-    :param filename: name of json file
+    gets hfss designs of project
+    :param data: dict with file data
+    :return: list of HFSSModel blocks
+    """
+    designs = items_of(data['AnsoftProject'], 'HFSSModel')
+    if not designs:
+        raise KeyError('HFSSModel')
+    return designs
+
+
+def get_design_coordinates(design: Dict[str, Any], parts: Callable[[str], bool] = None):
+    """
+    function gets coordinates of rectangles and arcs of one design using special dictionary path
+    :param design: HFSSModel block
+    :param parts: filter for part names or None for all parts
     :return:
     """
-    g = open(filename + '.json', encoding='utf-8', errors='ignore')
-    data = json.loads(g.read())
-    g.close()
-    geometry_data = data['AnsoftProject']['HFSSModel']['ModelSetup']['GeometryCore']['GeometryOperations']
+    geometry_data = design['ModelSetup']['GeometryCore']['GeometryOperations']
     res = dict()
-    res = create_coord_dict(geometry_data['ToplevelParts'], res)
-    res = create_coord_dict(geometry_data['OperandParts'], res)
-    variables = get_variables(data['AnsoftProject']['HFSSModel']['ModelSetup']['Properties'])
-    res_arcs, res_points = get_arc_data(geometry_data['ToplevelParts'], variables)
+    res = create_coord_dict(geometry_data['ToplevelParts'], res, parts)
+    res = create_coord_dict(geometry_data['OperandParts'], res, parts)
+    variables = get_variables(design['ModelSetup']['Properties'])
+    res_arcs, res_points = get_arc_data(geometry_data['ToplevelParts'], variables, parts)
     return res, res_arcs, res_points
 
 
+def get_coordinates(data: Dict[str, Any]):
+    """
+    function gets coordinates of rectangles and arcs of the first design from file data
+    :param data: dict with file data
+    :return:
+    """
+    return get_design_coordinates(get_designs(data)[0])
+
+
+def get_part_names(design: Dict[str, Any], patterns: Iterable[str] = None) -> List[str]:
+    """
+    gets names of parts used for footprint (with rectangles or polylines)
+    :param design: HFSSModel block
+    :param patterns: name patterns or None for all parts
+    :return: list of names in file order without repeats
+    """
+    geometry_data = design['ModelSetup']['GeometryCore']['GeometryOperations']
+    res: List[str] = []
+    for parts in ['ToplevelParts', 'OperandParts']:
+        for part in items_of(geometry_data[parts], 'GeometryPart'):
+            name = part['Attributes']['Name']
+            types = {operation['OperationType'] for operation in items_of(part['Operations'], 'Operation')}
+            if (name not in exclude_names and name not in res and match_name(name, patterns) and
+                    ('CoverLines' in types or parts == 'ToplevelParts' and 'Polyline' in types)):
+                res.append(name)
+    return res
+
+
 def get_indexes(coords: list) -> (int, int):
     """
     get indexes of coords elements
@@ -425,15 +1622,49 @@ def get_indexes(coords: list) -> (int, int):
     return indexes
 
 
-def get_points_for_arc(arcs: List[Arc], res_points: List[Point], delta: float) -> List[Point]:
+def get_arc_steps(radius: float, ang: float, delta: float, tolerance: float = None, max_points: int = None) -> int:
+    """
+    gets number of equal steps for arc
+    with tolerance step is the biggest angle with chord deviation from arc not more than tolerance
+    (but not more than max_step_angle), max_points limits number of steps
+    :param radius: arc radius
+    :param ang: arc angle in degrees
+    :param delta: accuracy in degrees (used without tolerance)
+    :param tolerance: max chord deviation in mm or None
+    :param max_points: max number of points for arc or None
+    :return: number of steps, 0 if arc is made with delta steps
+    """
+    if tolerance is not None and not tolerance > 0:
+        raise ValueError("chord tolerance must be positive: %s" % tolerance)
+    if max_points is not None and max_points <= 0:
+        raise ValueError("max number of arc points must be positive: %s" % max_points)
+    if tolerance is None:
+        if max_points is None or abs(ang) / delta <= max_points:
+            return 0
+        return max_points
+    if not ang:
+        return 0
+    step = max_step_angle
+    if tolerance < radius:
+        step = min(step, 2 * math.acos(1 - tolerance / radius) / math.pi * 180)
+    steps = math.ceil(abs(ang) / step)
+    if max_points is not None:
+        steps = min(steps, max_points)
+    return steps
+
+
+def get_points_for_arc(arcs: List[Arc], res_points: Path, delta: float, tolerance: float = None,
+                       max_points: int = None) -> Path:
     """
     gets points for polilyne instead of arcs
     :param res_points: start points for arcs data
     :param delta: accuracy in degrees
     :param arcs: arcs with data
-    :return: list of points with selected delta in degrees
+    :param tolerance: max chord deviation in mm, if set step for every arc is calculated from its radius
+    :param max_points: max number of points for every arc
+    :return: path with selected delta in degrees (or with selected tolerance)
     """
-    poly_points: List[Point] = []
+    poly_points = Path()
     for arc in arcs:
         if arc.type == "arc":
             start_point = res_points[arc.startindex]
@@ -444,9 +1675,16 @@ def get_points_for_arc(arcs: List[Arc], res_points: List[Point], delta: float) -
             y_c: float = arc.center_y
             r: float = math.sqrt((x - x_c) * (x - x_c) + (y - y_c) * (y - y_c))
             start_angle: float = math.atan2(y - y_c, x - x_c) / math.pi * 180
+            steps = get_arc_steps(r, ang, delta, tolerance, max_points)
+            if steps:
+                da: float = ang / steps
+                for k in range(steps):
+                    a = start_angle + k * da
+                    poly_points.append(x_c + r * math.cos(a / 180 * math.pi), y_c + r * math.sin(a / 180 * math.pi))
+                continue
             stop_angle: float = start_angle + ang
             if ang > 0:
-                da: float = delta
+                da = delta
                 cond = lambda a: a < stop_angle
             else:
                 da = -delta
@@ -455,97 +1693,1663 @@ def get_points_for_arc(arcs: List[Arc], res_points: List[Point], delta: float) -
             while cond(a):
                 x = x_c + r * math.cos(a / 180 * math.pi)
                 y = y_c + r * math.sin(a / 180 * math.pi)
-                poly_points.append(Point(x=x, y=y))
+                poly_points.append(x, y)
                 a += da
         if arc.type == "line":
             start_point = res_points[arc.startindex]
             end_point = res_points[arc.startindex + 1]
-            poly_points.append(Point(x=start_point.x, y=start_point.y))
-            poly_points.append(Point(x=end_point.x, y=end_point.y))
+            poly_points.append(start_point.x, start_point.y)
+            poly_points.append(end_point.x, end_point.y)
     return poly_points
 
 
-def get_kicad_line_for_polyline(poly_points: List[Point]) -> Tuple[str, str]:
+def get_points_array(arcs: List[Arc], res_points: Path, delta: float, tolerance: float = None,
+                     max_points: int = None) -> Path:
+    """
+    numpy version of get_points_for_arc: angles for every arc are generated as arrays,
+    coordinates for all arcs are calculated at once (line points are arcs with zero radius)
+    :param res_points: start points for arcs data
+    :param delta: accuracy in degrees
+    :param arcs: arcs with data
+    :param tolerance: max chord deviation in mm, if set step for every arc is calculated from its radius
+    :param max_points: max number of points for every arc
+    :return: path with the same points as from get_points_for_arc
+    """
+    angles = []
+    centers = []
+    radii = []
+    counts = []
+    for arc in arcs:
+        if arc.type == "arc":
+            start_point = res_points[arc.startindex]
+            x: float = start_point.x
+            y: float = start_point.y
+            ang: float = arc.angle
+            x_c: float = arc.center_x
+            y_c: float = arc.center_y
+            r: float = math.sqrt((x - x_c) * (x - x_c) + (y - y_c) * (y - y_c))
+            start_angle: float = math.atan2(y - y_c, x - x_c) / math.pi * 180
+            steps = get_arc_steps(r, ang, delta, tolerance, max_points)
+            if steps:
+                a = start_angle + np.arange(steps) * (ang / steps)
+                angles.append(a)
+                centers.append((x_c, y_c))
+                radii.append(r)
+                counts.append(steps)
+                continue
+            stop_angle: float = start_angle + ang
+            da: float = delta if ang > 0 else -delta
+            # a += da is repeated as in get_points_for_arc to get the same angles
+            steps = np.full(int(abs(ang) / delta) + 2, da, dtype=float)
+            steps[0] = start_angle
+            a = np.add.accumulate(steps)
+            while (a[-1] < stop_angle) if ang > 0 else (a[-1] > stop_angle):
+                steps = np.full(len(a), da, dtype=float)
+                steps[0] = a[-1] + da
+                a = np.concatenate((a, np.add.accumulate(steps)))
+            a = a[:np.count_nonzero(a < stop_angle if ang > 0 else a > stop_angle)]
+            angles.append(a)
+            centers.append((x_c, y_c))
+            radii.append(r)
+            counts.append(len(a))
+        if arc.type == "line":
+            for point in (res_points[arc.startindex], res_points[arc.startindex + 1]):
+                angles.append(np.zeros(1))
+                centers.append((point.x, point.y))
+                radii.append(0.)
+                counts.append(1)
+    if not angles:
+        return Path()
+    a = np.concatenate(angles) / 180 * np.pi
+    centers = np.repeat(np.array(centers), counts, axis=0)
+    radii = np.repeat(np.array(radii), counts)
+    return Path.from_array(np.column_stack((centers[:, 0] + radii * np.cos(a), centers[:, 1] + radii * np.sin(a))))
+
+
+class TessellationCache:
+    """
+    tessellated points of arcs and lines from previous conversions of one file (used in watch mode),
+    entries not used in the last conversion are removed by next_run
+    """
+    __slots__ = ('previous', 'current', 'hits', 'misses')
+
+    def __init__(self):
+        self.previous: Dict[tuple, array] = dict()
+        self.current: Dict[tuple, array] = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, arcs: List[Arc], res_points: Path, delta: float, tolerance: float = None,
+            max_points: int = None) -> Path:
+        """
+        gets points for polyline as get_points_for_arc, only arcs and lines not found in cache are tessellated
+        :return: path with points for all arcs
+        """
+        tessellate = get_points_array if np is not None else get_points_for_arc
+        poly_points = Path()
+        for arc in arcs:
+            start = 2 * arc.startindex
+            points = tuple(res_points.coords[start:start + (4 if arc.type == "line" else 2)])
+            key = (arc._replace(startindex=0), points, delta, tolerance, max_points)
+            coords = self.current.get(key)
+            if coords is None:
+                coords = self.previous.get(key)
+            if coords is None:
+                coords = tessellate([arc], res_points, delta, tolerance, max_points).coords
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.current[key] = coords
+            poly_points.coords.extend(coords)
+        return poly_points
+
+    def next_run(self):
+        """
+        keeps only entries used since previous call
+        :return:
+        """
+        self.previous, self.current = self.current, dict()
+
+
+# cache for tessellated arcs or None
+tessellation_cache: Optional[TessellationCache] = None
+
+
+def farthest_point(xs: Any, ys: Any, first: int, last: int) -> Tuple[int, float]:
     """
-    gets list of points and returnes str with KiCad poly
-    :param poly_points: points with lie data
-    :return: string for KiCadPoly with this data
+    finds point between first and last points which is farthest from segment first-last
+    :param xs: x coordinates (list or numpy array)
+    :param ys: y coordinates (list or numpy array)
+    :param first: index of first point of segment
+    :param last: index of last point of segment
+    :return: index of point and its distance to segment
     """
-    line1_res = '(fp_poly (pts '
-    line2_res = '(fp_poly (pts '
-    for p in poly_points:
-        line1_res += '( xy %f %f)\n' % (p.x, p.y)
-        line2_res += '( xy %f %f)\n' % (-p.x, p.y)
-    line1_res += ") (layer F.Cu) (width 0.001)) \n"
-    line2_res += ") (layer F.Cu) (width 0.001)) \n"
+    x0, y0, dx, dy = xs[first], ys[first], xs[last] - xs[first], ys[last] - ys[first]
+    length = dx * dx + dy * dy
+    if np is not None and last - first > 32:
+        px, py = xs[first + 1:last] - x0, ys[first + 1:last] - y0
+        t = np.clip((px * dx + py * dy) / length, 0, 1) if length else 0
+        distances = np.hypot(px - t * dx, py - t * dy)
+        index = int(np.argmax(distances))
+        return first + 1 + index, float(distances[index])
+    res = (first, -1.)
+    for k in range(first + 1, last):
+        px, py = xs[k] - x0, ys[k] - y0
+        t = min(max((px * dx + py * dy) / length, 0), 1) if length else 0
+        distance = math.hypot(px - t * dx, py - t * dy)
+        if distance > res[1]:
+            res = (k, distance)
+    return res
+
+
+def simplify_path(path: Path, tolerance: float) -> Path:
+    """
+    removes repeated points and points closer than tolerance to outline (Douglas-Peucker) from closed polygon
+    :param path: points of polygon
+    :param tolerance: max distance in mm of removed points from new outline
+    :return: new path, the same points if polygon would have less than three points
+    """
+    xs, ys = path.coords[0::2], path.coords[1::2]
+    if np is not None:
+        xs, ys = np.array(xs), np.array(ys)
+    # points equal to previous point are removed, last points equal to first point too
+    repeated = [k for k in range(1, len(xs)) if abs(xs[k] - xs[k - 1]) <= 1e-9 and abs(ys[k] - ys[k - 1]) <= 1e-9] \
+        if np is None else np.flatnonzero((np.abs(np.diff(xs)) <= 1e-9) & (np.abs(np.diff(ys)) <= 1e-9)) + 1
+    n = len(xs) - len(repeated)
+    if n < 4:
+        return Path(path.coords)
+    if np is not None:
+        xs, ys = np.delete(xs, repeated), np.delete(ys, repeated)
+    else:
+        repeated = set(repeated)
+        xs = array('d', (x for k, x in enumerate(xs) if k not in repeated))
+        ys = array('d', (y for k, y in enumerate(ys) if k not in repeated))
+    while n > 3 and abs(xs[n - 1] - xs[0]) <= 1e-9 and abs(ys[n - 1] - ys[0]) <= 1e-9:
+        n -= 1
+    # polygon is closed: point n is point 0, polygon is split at the point farthest from point 0
+    if np is not None:
+        xs, ys = np.append(xs[:n], xs[0]), np.append(ys[:n], ys[0])
+        far = int(np.argmax((xs - xs[0]) ** 2 + (ys - ys[0]) ** 2))
+    else:
+        xs, ys = xs[:n] + xs[:1], ys[:n] + ys[:1]
+        far = max(range(n), key=lambda k: (xs[k] - xs[0]) ** 2 + (ys[k] - ys[0]) ** 2)
+    keep = bytearray(n + 1)
+    keep[0] = keep[far] = 1
+    segments = [(0, far), (far, n)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        index, distance = farthest_point(xs, ys, first, last)
+        if distance > tolerance:
+            keep[index] = 1
+            segments.extend([(first, index), (index, last)])
+    res = Path(c for k in range(n) if keep[k] for c in (xs[k], ys[k]))
+    return res if len(res) >= 3 else Path(path.coords)
+
+
+def rectangle_box(rectangle: Path, tolerance: float) -> Optional[Tuple[float, float, float, float]]:
+    """
+    :param rectangle: four points of rectangle
+    :param tolerance: max difference of coordinates in mm
+    :return: x0, y0, x1, y1 if rectangle is axis aligned else None
+    """
+    xs, ys = rectangle.coords[0::2], rectangle.coords[1::2]
+    box = (min(xs), min(ys), max(xs), max(ys))
+    if box[2] - box[0] <= tolerance or box[3] - box[1] <= tolerance:
+        return None
+    corners = {(abs(x - box[0]) <= tolerance, abs(y - box[1]) <= tolerance) for x, y in zip(xs, ys)
+               if (abs(x - box[0]) <= tolerance or abs(x - box[2]) <= tolerance) and
+               (abs(y - box[1]) <= tolerance or abs(y - box[3]) <= tolerance)}
+    return box if len(corners) == 4 else None
+
+
+def snap_values(values: Iterable[float], tolerance: float) -> List[float]:
+    """
+    :return: sorted values, values closer than tolerance to previous value are removed
+    """
+    res: List[float] = []
+    for value in sorted(values):
+        if not res or value - res[-1] > tolerance:
+            res.append(value)
+    return res
+
+
+def union_outline(boxes: List[Tuple[float, float, float, float]], tolerance: float) -> Optional[Path]:
+    """
+    gets outline of union of axis aligned rectangles on grid of their coordinates
+    :param boxes: rectangles x0, y0, x1, y1
+    :param tolerance: coordinates closer than tolerance are the same
+    :return: outline counterclockwise or None if union has holes or several parts
+    """
+    xs = snap_values((c for box in boxes for c in (box[0], box[2])), tolerance)
+    ys = snap_values((c for box in boxes for c in (box[1], box[3])), tolerance)
+    index = lambda values, value: bisect.bisect_right(values, value + tolerance) - 1
+    covered = set()
+    for x0, y0, x1, y1 in boxes:
+        for i in range(index(xs, x0), index(xs, x1)):
+            for j in range(index(ys, y0), index(ys, y1)):
+                covered.add((i, j))
+    edges: Dict[Tuple[int, int], Tuple[int, int]] = dict()
+    for i, j in covered:
+        for start, end, neighbour in [((i, j), (i + 1, j), (i, j - 1)), ((i + 1, j), (i + 1, j + 1), (i + 1, j)),
+                                      ((i + 1, j + 1), (i, j + 1), (i, j + 1)), ((i, j + 1), (i, j), (i - 1, j))]:
+            if neighbour not in covered:
+                if start in edges:
+                    return None
+                edges[start] = end
+    vertex = start = min(edges)
+    loop = []
+    while True:
+        loop.append(vertex)
+        vertex = edges[vertex]
+        if vertex == start:
+            break
+    if len(loop) != len(edges):
+        return None
+    res = Path()
+    for k, (i, j) in enumerate(loop):
+        (i0, j0), (i1, j1) = loop[k - 1], loop[(k + 1) % len(loop)]
+        if (i0 == i == i1) or (j0 == j == j1):
+            continue
+        res.append(xs[i], ys[j])
+    return res
+
+
+def merge_rectangles(rectangles: List[Path], tolerance: float) -> List[Path]:
+    """
+    replaces axis aligned rectangles touching by side or overlapping with outlines of their unions
+    :param rectangles: rectangles (four points)
+    :param tolerance: max gap between touching rectangles in mm
+    :return: outlines in order of their first rectangles, other rectangles are not changed
+    """
+    boxes = [rectangle_box(rectangle, tolerance) for rectangle in rectangles]
+    groups = list(range(len(rectangles)))
+
+    def group(k: int) -> int:
+        while groups[k] != k:
+            groups[k] = groups[groups[k]]
+            k = groups[k]
+        return k
+
+    order = sorted((k for k, box in enumerate(boxes) if box is not None), key=lambda k: boxes[k][0])
+    for n, k in enumerate(order):
+        for m in order[n + 1:]:
+            if boxes[m][0] > boxes[k][2] + tolerance:
+                break
+            overlap_x = min(boxes[k][2], boxes[m][2]) - max(boxes[k][0], boxes[m][0])
+            overlap_y = min(boxes[k][3], boxes[m][3]) - max(boxes[k][1], boxes[m][1])
+            if overlap_x >= -tolerance and overlap_y >= -tolerance and max(overlap_x, overlap_y) > tolerance:
+                groups[group(m)] = group(k)
+    members: Dict[int, List[int]] = dict()
+    for k in range(len(rectangles)):
+        members.setdefault(group(k), []).append(k)
+    res = []
+    for numbers in members.values():
+        outline = union_outline([boxes[k] for k in numbers], tolerance) if len(numbers) > 1 else None
+        if outline is None:
+            res.extend(rectangles[k] for k in numbers)
+        else:
+            res.append(outline)
+    return res
+
+
+def format_points(template: str, coords: Iterable[float]) -> str:
+    """
+    formats all points with one operation
+    :param template: template for one point with two numbers, for example '(xy %f %f) '
+    :param coords: flat list or array of coordinates: x0, y0, x1, y1...
+    :return: text with all points
+    """
+    coords = tuple(coords)
+    return template * (len(coords) // 2) % coords
+
+
+def get_kicad_line_for_polyline(poly_points: Path) -> Tuple[str, str]:
+    """
+    gets path and returnes str with KiCad poly
+    :param poly_points: path with line data
+    :return: string for KiCadPoly with this data (direct and inverted)
+    """
+    direct = poly_points.coords
+    inverted = poly_points.mirrored().coords
+    line1_res = '(fp_poly (pts ' + format_points('( xy %f %f)\n', direct) + ") (layer F.Cu) (width 0.001)) \n"
+    line2_res = '(fp_poly (pts ' + format_points('( xy %f %f)\n', inverted) + ") (layer F.Cu) (width 0.001)) \n"
     return line1_res, line2_res
 
 
-def write_to_files(filename: str, res: dict, arcs: List[Arc], res_points: List[Point]):
+@dataclass
+class Geometry:
     """
-    function creates kicad_mod files (direct and inverted)
-    :param res_points: list of start points data
-    :param arcs: list of arcs data
-    :param filename: name of file
-    :param res: dict with coordinates
-    :return:
+    footprint geometry used by all output formats: polygons of rectangles and one polygon of polylines
     """
-    f1 = open(filename + ".kicad_mod", "w")
-    f1.write("(module %s\n" % filename)
-    f2 = open(filename + "_inverted.kicad_mod", "w")
-    f2.write("(module %s\n" % filename)
-    [i, j] = get_indexes(res[list(res.keys())[0]])
+    rectangles: List[Path] = field(default_factory=list)
+    polyline: Path = field(default_factory=Path)
+
 
+def create_geometry(res: Dict[int, Path], arcs: List[Arc], res_points: Path) -> Geometry:
+    """
+    function gets footprint geometry: rectangles and tessellated polylines
+    :param res: dict with rectangles
+    :param arcs: list of arcs data
+    :param res_points: start points data
+    :return: geometry
+    """
+    rectangles = []
+    if res:
+        [i, j] = get_indexes(res[list(res.keys())[0]])
     for rect in res.keys():
         points = res[rect]
         if len(points) == 4 and abs((points[1][0] - points[0][0]) * (points[0][1] - points[1][1])) < 200:
-            s1 = "  (fp_poly (pts "
-            s2 = "  (fp_poly (pts "
-            for point in points:
-                s1 += ("(xy %.6f %.6f) " % (point[i], point[j]))
-                s2 += ("(xy %.6f %.6f) " % (0 - point[i], point[j]))
-            f1.write(s1[:-1] + ") (layer F.Cu) (width 0.001) )\n" + "   ")
-            f2.write(s2[:-1] + ") (layer F.Cu) (width 0.001) )\n" + "   ")
-
-    poly_points: List[Point] = get_points_for_arc(arcs, res_points, deg_delta)
-    if poly_points:
-        line1_res, line2_res = get_kicad_line_for_polyline(poly_points)
-        f1.write(line1_res)
-        f2.write(line2_res)
-    f1.write(")")
-    f1.close()
-    f2.write(")")
-    f2.close()
-
-
-def main(filename: str) -> bool:
+            rectangles.append(points.columns(i, j))
+    if simplify_tolerance is not None:
+        with stage("simplify") as stats:
+            merged = merge_rectangles(rectangles, simplify_tolerance)
+            stats.count(polygons=len(rectangles) - len(merged))
+            rectangles = merged
+
+    with stage("tessellate") as stats:
+        if tessellation_cache is not None:
+            poly_points = tessellation_cache.get(arcs, res_points, deg_delta, chord_tolerance, max_arc_points)
+        elif np is not None:
+            poly_points = get_points_array(arcs, res_points, deg_delta, chord_tolerance, max_arc_points)
+        else:
+            poly_points = get_points_for_arc(arcs, res_points, deg_delta, chord_tolerance, max_arc_points)
+        stats.count(arcs=sum(1 for arc in arcs if arc.type == "arc"), points=len(poly_points))
+    if simplify_tolerance is not None:
+        with stage("simplify") as stats:
+            simplified = simplify_path(poly_points, simplify_tolerance)
+            stats.count(points=len(poly_points) - len(simplified))
+            poly_points = simplified
+    return Geometry(rectangles, poly_points)
+
+
+def format_kicad_mod(name: str, geometry: Geometry) -> Tuple[str, str]:
+    """
+    function creates kicad_mod texts (direct and inverted)
+    :param name: footprint name
+    :param geometry: footprint geometry
+    :return: direct and inverted kicad_mod texts
+    """
+    text1 = ["(module %s\n" % name]
+    text2 = ["(module %s\n" % name]
+    with stage("format") as stats:
+        for rectangle in geometry.rectangles:
+            s1 = format_points("(xy %.6f %.6f) ", rectangle.coords)
+            s2 = format_points("(xy %.6f %.6f) ", rectangle.mirrored(signed_zero=False).coords)
+            text1.append("  (fp_poly (pts " + s1[:-1] + ") (layer F.Cu) (width 0.001) )\n" + "   ")
+            text2.append("  (fp_poly (pts " + s2[:-1] + ") (layer F.Cu) (width 0.001) )\n" + "   ")
+            stats.count(points=len(rectangle))
+        if len(geometry.polyline):
+            line1_res, line2_res = get_kicad_line_for_polyline(geometry.polyline)
+            text1.append(line1_res)
+            text2.append(line2_res)
+            stats.count(points=len(geometry.polyline))
+    text1.append(")")
+    text2.append(")")
+    return ''.join(text1), ''.join(text2)
+
+
+def create_kicad_mod(name: str, res: Dict[int, Path], arcs: List[Arc], res_points: Path) -> Tuple[str, str]:
+    """
+    function creates kicad_mod texts (direct and inverted)
+    :param name: footprint name
+    :param res: dict with rectangles
+    :param arcs: list of arcs data
+    :param res_points: start points data
+    :return: direct and inverted kicad_mod texts
+    """
+    return format_kicad_mod(name, create_geometry(res, arcs, res_points))
+
+
+@dataclass
+class Footprint:
+    """
+    footprint geometry, kicad_mod texts are created once when they are used
+    """
+    name: str
+    geometry: Geometry
+
+    @functools.cached_property
+    def texts(self) -> Tuple[str, str]:
+        return format_kicad_mod(self.name, self.geometry)
+
+    @property
+    def text(self) -> str:
+        return self.texts[0]
+
+    @property
+    def inverted_text(self) -> str:
+        return self.texts[1]
+
+
+def load_data(source: Any, legacy: bool = False) -> Dict[str, Any]:
+    """
+    reads hfss data used for footprints
+    :param source: file name, bytes with file content or file object
+    :param legacy: use regexp json conversion instead of parser
+    :return: dict with file data
+    """
+    if legacy:
+        return load_project_json(source)
+    if not isinstance(source, (str, os.PathLike, bytes, bytearray)):
+        # file object can not be mapped, it is streamed line by line so memory does not depend on its size
+        return load_project(source, geometry_blocks)
+    with stage("parse") as stats, LazyProject(source) as project:
+        data = project.select(geometry_blocks)
+        stats.count(blocks=project.blocks_found, lines=project.lines_decoded)
+    return data
+
+
+def design_footprint(design: Dict[str, Any], name: str, parts: Callable[[str], bool] = None) -> Footprint:
+    """
+    converts one design to kicad footprint
+    :param design: HFSSModel block
+    :param name: footprint name
+    :param parts: filter for part names or None for all parts
+    :return: footprint with direct and inverted kicad_mod texts
+    """
+    with stage("geometry") as stats:
+        res, arcs, points = get_design_coordinates(design, parts)
+        new_res = {}
+        for key in sorted(res.keys()):
+            new_res[key] = res[key]
+        stats.count(parts=len(res), arcs=sum(1 for arc in arcs if arc.type == "arc"), points=len(points))
+    return Footprint(name=name, geometry=create_geometry(new_res, arcs, points))
+
+
+def convert(source: Any, name: str = None, legacy: bool = False) -> Footprint:
+    """
+    converts the first design of hfss data to kicad footprint in memory
+    :param source: file name, bytes with file content or file object
+    :param name: footprint name, by default file name without extension
+    :param legacy: use regexp json conversion instead of parser
+    :return: footprint with direct and inverted kicad_mod texts
+    """
+    data = load_data(source, legacy)
+    return design_footprint(get_designs(data)[0], name or source_name(source))
+
+
+def name_part(name: str) -> str:
+    """
+    :return: design or part name usable in file name
+    """
+    return re.sub(r'[^\w.-]+', '_', name)
+
+
+def convert_all(source: Any, name: str = None, legacy: bool = False, designs: Iterable[str] = None,
+                parts: Iterable[str] = None, split: bool = False) -> List[Footprint]:
+    """
+    converts hfss data parsed once to footprints: one for every selected design or for every selected part,
+    design name is added to footprint name if project has several designs, part name is added for split
+    :param source: file name, bytes with file content or file object
+    :param name: base footprint name, by default file name without extension
+    :param legacy: use regexp json conversion instead of parser
+    :param designs: design name patterns, None for all designs
+    :param parts: part name patterns, None for all parts
+    :param split: footprint for every part
+    :return: list of footprints
+    """
+    data = load_data(source, legacy)
+    name = name or source_name(source)
+    all_designs = get_designs(data)
+    res: List[Footprint] = []
+    for design in all_designs:
+        design_name = design.get('Name', 'HFSSModel')
+        if not match_name(design_name, designs):
+            continue
+        base = name if len(all_designs) == 1 else "%s_%s" % (name, name_part(design_name))
+        if split:
+            for part in get_part_names(design, parts):
+                res.append(design_footprint(design, "%s_%s" % (base, name_part(part)), part.__eq__))
+        else:
+            res.append(design_footprint(design, base, None if parts is None else lambda n: match_name(n, parts)))
+    if not res:
+        raise KeyError("no designs or parts selected")
+    return res
+
+
+# parameters of Rectangle operation: start point, width and height
+rectangle_keys = ('XStart', 'YStart', 'ZStart', 'Width', 'Height')
+
+# rectangle axis: coordinates of width and height
+rectangle_axes = {'Z': (0, 1), 'X': (1, 2), 'Y': (2, 0)}
+
+
+def expression_names(value: Any) -> Set[str]:
+    """
+    :param value: attribute value, block or list
+    :return: names used by expressions in value
+    """
+    if isinstance(value, str):
+        try:
+            return Expression(value).names
+        except ExpressionError:
+            return set()
+    if isinstance(value, dict):
+        return set().union(*(expression_names(item) for item in value.values()))
+    if isinstance(value, list):
+        return set().union(*(expression_names(item) for item in value))
+    return set()
+
+
+class SweepTemplate:
+    """
+    design parsed once for parameter sweeps: polyline points, arcs and rectangle parameters are kept as expressions
+    and only points, arcs and rectangles using changed variables are evaluated for new values
+    """
+    __slots__ = ('name', 'variables', 'values', 'angles', 'rectangles', 'rectangle_expressions', 'rectangle_users',
+                 'point_expressions', 'arc_expressions', 'points', 'arcs', 'users')
+
+    def __init__(self, design: Dict[str, Any], name: str):
+        """
+        :param design: HFSSModel block
+        :param name: footprint name
+        """
+        geometry_data = design['ModelSetup']['GeometryCore']['GeometryOperations']
+        self.name = name
+        self.variables = get_variable_expressions(design['ModelSetup']['Properties'])
+        self.values = evaluate_variables(self.variables)
+        self.angles = angle_variables(self.variables)
+        res = create_coord_dict(geometry_data['ToplevelParts'], dict())
+        parts = {number: part for number, part in enumerate(items_of(geometry_data['ToplevelParts'], 'GeometryPart'))
+                 if number in res}
+        start = max(res.keys(), default=-1) + 1
+        res = create_coord_dict(geometry_data['OperandParts'], res)
+        parts.update((number, part) for number, part in
+                     enumerate(items_of(geometry_data['OperandParts'], 'GeometryPart'), start) if number in res)
+        self.rectangles = {key: res[key] for key in sorted(res.keys())}
+        # number of rectangle: part name, axis and expressions of RectangleParameters (None if they can not be used)
+        self.rectangle_expressions: Dict[int, Tuple[str, Optional[str], Optional[Tuple[Expression, ...]]]] = dict()
+        # variable name: numbers of rectangles using variable
+        self.rectangle_users: Dict[str, List[int]] = dict()
+        for number, part in parts.items():
+            names, self.rectangle_expressions[number] = self.rectangle_template(part)
+            for variable in names:
+                self.rectangle_users.setdefault(variable, []).append(number)
+        self.point_expressions: List[Tuple[Expression, Expression]] = []
+        self.arc_expressions: List[Optional[Tuple[Expression, Expression, Expression]]] = []
+        self.arcs: List[Arc] = []
+        for geometry_part in items_of(geometry_data['ToplevelParts'], 'GeometryPart'):
+            for operation in items_of(geometry_part['Operations'], 'Operation'):
+                if operation['OperationType'] != 'Polyline':
+                    continue
+                offset = len(self.point_expressions)
+                for segment in items_of(operation['PolylineParameters']['PolylineSegments'], 'PLSegment'):
+                    if segment['SegmentType'] == 'AngularArc':
+                        self.arcs.append(Arc(startindex=segment['StartIndex'] + offset,
+                                             number_of_point=segment['NoOfPoints'],
+                                             numberofsegments=int(segment['NoOfSegments']), type="arc"))
+                        self.arc_expressions.append((Expression(segment['ArcAngle']),
+                                                     Expression(segment['ArcCenterX']),
+                                                     Expression(segment['ArcCenterY'])))
+                    elif segment['SegmentType'] == 'Line':
+                        self.arcs.append(Arc(type="line", startindex=segment['StartIndex'] + offset,
+                                             number_of_point=segment['NoOfPoints']))
+                        self.arc_expressions.append(None)
+                for point in items_of(operation['PolylineParameters']['PolylinePoints'], 'PLPoint'):
+                    self.point_expressions.append((self.expression(point['X']), self.expression(point['Y'])))
+        # variable name: numbers of points and arcs using variable
+        self.users: Dict[str, Tuple[List[int], List[int]]] = dict()
+        for number, expressions in enumerate(self.point_expressions):
+            for variable in expressions[0].names | expressions[1].names:
+                self.users.setdefault(variable, ([], []))[0].append(number)
+        for number, expressions in enumerate(self.arc_expressions):
+            for variable in set().union(*(e.names for e in expressions or ())):
+                self.users.setdefault(variable, ([], []))[1].append(number)
+        self.points = Path()
+        for number in range(len(self.point_expressions)):
+            self.points.append(*self.evaluate_point(number, self.values))
+        for number in range(len(self.arcs)):
+            self.arcs[number] = self.evaluate_arc(number, self.values)
+
+    @staticmethod
+    def expression(text: str) -> Expression:
+        """
+        :return: expression for point coordinate, coordinates that can not be parsed are 0 as in get_arc_data
+        """
+        try:
+            return Expression(text)
+        except ValueError:
+            return Expression("0")
+
+    def evaluate_point(self, number: int, values: Dict[str, float]) -> Tuple[float, float]:
+        """
+        :param number: number of point
+        :param values: variable values
+        :return: point coordinates, (0, 0) if point can not be evaluated as in get_arc_data
+        """
+        try:
+            return tuple(expression(values) for expression in self.point_expressions[number])
+        except (KeyError, ValueError, ArithmeticError):
+            return 0, 0
+
+    def rectangle_template(self, part: Dict[str, Any]) -> Tuple[Set[str], Tuple[str, Optional[str], Any]]:
+        """
+        finds variables used by operations of rectangle part, rectangle can be evaluated for new values
+        if part has only Rectangle and CoverLines operations
+        :param part: GeometryPart block
+        :return: variables used by part, part name, axis and expressions of XStart, YStart, ZStart, Width, Height
+        """
+        names: Set[str] = set()
+        parameters = None
+        other = False
+        for operation in items_of(part['Operations'], 'Operation'):
+            if operation['OperationType'] == 'CoverLines':
+                continue
+            names |= {name for key, value in operation.items() if key != 'OperationIdentity'
+                      for name in expression_names(value) if name in self.variables}
+            if operation['OperationType'] == 'Rectangle' and parameters is None:
+                parameters = operation.get('RectangleParameters')
+            else:
+                other = True
+        expressions = None
+        axis = parameters.get('WhichAxis') if parameters is not None else None
+        if parameters is not None and not other and axis in rectangle_axes:
+            try:
+                expressions = tuple(Expression(parameters[key]) for key in rectangle_keys)
+            except (KeyError, ExpressionError):
+                pass
+        return names, (part['Attributes']['Name'], axis, expressions)
+
+    def evaluate_rectangle(self, number: int, values: Dict[str, float]) -> Path:
+        """
+        moves and scales template rectangle vertices as RectangleParameters change
+        :param number: number of rectangle
+        :param values: variable values
+        :return: rectangle vertices for values
+        """
+        name, axis, expressions = self.rectangle_expressions[number]
+        if expressions is None:
+            raise ExpressionError("rectangle %s can not be evaluated for new values" % name)
+        old = [expression(self.values) for expression in expressions]
+        new = [expression(values) for expression in expressions]
+        rectangle = self.rectangles[number]
+        res = Path(rectangle.coords, dims=rectangle.dims)
+        width, height = rectangle_axes[axis]
+        for column in range(min(3, rectangle.dims)):
+            size = 3 if column == width else 4 if column == height else None
+            if size is not None and not old[size]:
+                raise ExpressionError("rectangle %s has zero size" % name)
+            scale = 1 if size is None else new[size] / old[size]
+            for k in range(column, len(res.coords), rectangle.dims):
+                res.coords[k] = new[column] + (res.coords[k] - old[column]) * scale
+        return res
+
+    def evaluate_arc(self, number: int, values: Dict[str, float]) -> Arc:
+        """
+        :param number: number of arc
+        :param values: variable values
+        :return: arc with angle and center for values
+        """
+        if self.arc_expressions[number] is None:
+            return self.arcs[number]
+        angle, center_x, center_y = (expression(values) for expression in self.arc_expressions[number])
+        return self.arcs[number]._replace(angle=angle, center_x=center_x, center_y=center_y)
+
+    def hook_parameters(self, variables: Dict[str, str], values: Dict[str, Any],
+                        evaluated: Dict[str, float]) -> Dict[str, Any]:
+        """
+        gets variables for parameters_hook as get_variables gives them for project with new values:
+        other variables keep their expressions (hook evaluates them itself), new values are evaluated and have
+        the type of template value: float in mm or string ('45.0deg' for angles, '2.0' for lengths)
+        :param variables: variable expressions with new values
+        :param values: new values
+        :param evaluated: variable values in mm and degrees
+        :return: dict with variables
+        """
+        res = {variable: parameter_value(value) for variable, value in variables.items()}
+        for variable in values:
+            if isinstance(parameter_value(self.variables[variable]), float):
+                res[variable] = evaluated[variable]
+            else:
+                res[variable] = "%rdeg" % evaluated[variable] if variable in self.angles else repr(evaluated[variable])
+        return res
+
+    def footprint(self, values: Dict[str, Any] = None, name: str = None) -> Footprint:
+        """
+        creates footprint for variable values
+        :param values: new values of project variables: expressions like '1.7mm' or numbers (mm and degrees)
+        :param name: footprint name, template name by default
+        :return: footprint with direct and inverted kicad_mod texts
+        """
+        values = values or dict()
+        unknown = [variable for variable in values if variable not in self.variables]
+        if unknown:
+            raise KeyError("unknown variables: %s" % ", ".join(unknown))
+        with stage("evaluate") as stats:
+            variables = dict(self.variables)
+            variables.update((key, value if isinstance(value, str) else repr(value)) for key, value in values.items())
+            evaluated = evaluate_variables(variables)
+            for variable in values:
+                if variable not in evaluated:
+                    raise ExpressionError("wrong value of %s: %s" % (variable, variables[variable]))
+            changed = [variable for variable in self.variables
+                       if evaluated.get(variable) != self.values.get(variable)]
+            point_numbers = sorted({n for variable in changed for n in self.users.get(variable, ([], []))[0]})
+            arc_numbers = sorted({n for variable in changed for n in self.users.get(variable, ([], []))[1]})
+            points = Path(self.points.coords)
+            for number in point_numbers:
+                points.coords[2 * number:2 * number + 2] = array('d', self.evaluate_point(number, evaluated))
+            arcs = list(self.arcs)
+            for number in arc_numbers:
+                arcs[number] = self.evaluate_arc(number, evaluated)
+            rectangle_numbers = sorted({n for variable in changed for n in self.rectangle_users.get(variable, [])})
+            rectangles = dict(self.rectangles)
+            for number in rectangle_numbers:
+                rectangles[number] = self.evaluate_rectangle(number, evaluated)
+            if parameters_hook is not None:
+                try:
+                    parameters_hook(self.hook_parameters(variables, values, evaluated), points)
+                except KeyError:
+                    pass
+                except (ValueError, TypeError, IndexError, ArithmeticError) as e:
+                    raise ValueError("parameters hook failed: %s: %s" % (type(e).__name__, e))
+            stats.count(variables=len(changed), points=len(point_numbers), arcs=len(arc_numbers),
+                        rectangles=len(rectangle_numbers))
+        return Footprint(name=name or self.name, geometry=create_geometry(rectangles, arcs, points))
+
+
+def load_templates(source: Any, name: str = None, legacy: bool = False,
+                   designs: Iterable[str] = None) -> List[SweepTemplate]:
+    """
+    parses hfss data once for parameter sweeps
+    :param source: file name, bytes with file content or file object
+    :param name: base footprint name, by default file name without extension
+    :param legacy: use regexp json conversion instead of parser
+    :param designs: design name patterns, None for all designs
+    :return: template for every selected design, design name is added to name if project has several designs
+    """
+    data = load_data(source, legacy)
+    name = name or source_name(source)
+    all_designs = get_designs(data)
+    res = []
+    for design in all_designs:
+        design_name = design.get('Name', 'HFSSModel')
+        if match_name(design_name, designs):
+            base = name if len(all_designs) == 1 else "%s_%s" % (name, name_part(design_name))
+            res.append(SweepTemplate(design, base))
+    if not res:
+        raise KeyError("no designs selected")
+    return res
+
+
+def read_sweep(filename: str) -> List[Dict[str, str]]:
+    """
+    reads variable sets for sweep from csv file: header contains variable names, every row is one set
+    :param filename: name of csv file
+    :return: list of dicts with variable values
+    """
+    with open(filename, newline='') as f:
+        return [{key.strip(): value.strip() for key, value in row.items() if value and value.strip()}
+                for row in csv.DictReader(f, skipinitialspace=True)]
+
+
+def sweep_to_files(filename: str, value_sets: List[Dict[str, Any]], legacy: bool = False) -> List[str]:
+    """
+    parses hfss file once and creates kicad_mod files <name>_<number> for every variable set
+    :param filename: name of hfss file
+    :param value_sets: list of dicts with variable values
+    :param legacy: use regexp json conversion instead of parser
+    :return: footprint names
+    """
+    names = []
+    for template in load_templates(filename, legacy=legacy, designs=design_patterns):
+        for number, values in enumerate(value_sets, 1):
+            footprint = template.footprint(values, "%s_%d" % (template.name, number))
+            write_to_files(footprint)
+            names.append(footprint.name)
+    return names
+
+
+def write_atomic(filename: str, text: Any):
+    """
+    writes text to temporary file near filename and renames it, so file is never written partly
+    :param filename: name of file
+    :param text: file content, str or bytes
+    :return:
+    """
+    temp = "%s.%s.tmp" % (filename, uuid.uuid4().hex[:8])
     try:
-        create_first_json(filename)
-    except FileNotFoundError:
-        print("File %s not found" % filename)
-        return False
-    filename = filename.split('.')[0]
-    create_second_json(filename)
+        with open(temp, "xb" if isinstance(text, bytes) else "x") as f:
+            f.write(text)
+        os.replace(temp, filename)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def geometry_dict(footprint: Footprint) -> Dict[str, Any]:
+    """
+    :param footprint: footprint
+    :return: dict with name and flat coordinates x0, y0, x1, y1... of rectangles and polyline
+    """
+    geometry = footprint.geometry
+    return {"name": footprint.name, "rectangles": [rectangle.coords.tolist() for rectangle in geometry.rectangles],
+            "polyline": geometry.polyline.coords.tolist()}
+
+
+def footprint_from_dict(data: Dict[str, Any]) -> Footprint:
+    """
+    :param data: dict from geometry_dict
+    :return: footprint
+    """
+    return Footprint(name=data["name"], geometry=Geometry([Path(rectangle) for rectangle in data["rectangles"]],
+                                                          Path(data["polyline"])))
+
+
+def render_json(footprint: Footprint) -> str:
+    """
+    :return: json with footprint geometry
+    """
+    return json.dumps(geometry_dict(footprint))
+
+
+def render_npz(footprint: Footprint) -> bytes:
+    """
+    :return: numpy npz archive: polyline (N, 2), points of all rectangles (M, 2) and rectangle_sizes (numbers of points)
+    """
+    geometry = footprint.geometry
+    rectangles = [rectangle.as_array() for rectangle in geometry.rectangles]
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, polyline=geometry.polyline.as_array(),
+                        rectangles=np.concatenate(rectangles) if rectangles else np.zeros((0, 2)),
+                        rectangle_sizes=np.array([len(rectangle) for rectangle in rectangles], dtype=int))
+    return buffer.getvalue()
+
+
+def render_svg(footprint: Footprint) -> str:
+    """
+    :return: svg preview of footprint (coordinates in mm, y axis down as in kicad)
+    """
+    geometry = footprint.geometry
+    polygons = geometry.rectangles + ([geometry.polyline] if len(geometry.polyline) else [])
+    xs = [x for polygon in polygons for x in polygon.coords[0::2]] or [0]
+    ys = [y for polygon in polygons for y in polygon.coords[1::2]] or [0]
+    margin = max(max(xs) - min(xs), max(ys) - min(ys), 1) * 0.05
+    x0, y0, width, height = (min(xs) - margin, min(ys) - margin, max(xs) - min(xs) + 2 * margin,
+                             max(ys) - min(ys) + 2 * margin)
+    text = ['<svg xmlns="http://www.w3.org/2000/svg" viewBox="%f %f %f %f" width="%fmm" height="%fmm">\n'
+            % (x0, y0, width, height, width, height), '<title>%s</title>\n' % footprint.name,
+            '<g fill="#c83434" fill-opacity="0.8" stroke="none">\n']
+    text.extend('<polygon points="%s"/>\n' % format_points("%f,%f ", polygon.coords)[:-1] for polygon in polygons)
+    text.append('</g>\n</svg>\n')
+    return ''.join(text)
+
+
+@dataclass
+class OutputFormat:
+    name: str
+    suffix: str
+    render: Callable[[Footprint], Any]
+    description: str
+
+
+output_formats = {f.name: f for f in [
+    OutputFormat("kicad_mod", ".kicad_mod", lambda footprint: footprint.text, "kicad footprint"),
+    OutputFormat("inverted", "_inverted.kicad_mod", lambda footprint: footprint.inverted_text,
+                 "kicad footprint mirrored by x"),
+    OutputFormat("json", ".json", render_json, "json with coordinates of polygons"),
+    OutputFormat("npz", ".npz", render_npz, "numpy arrays with coordinates of polygons (needs numpy)"),
+    OutputFormat("svg", ".svg", render_svg, "svg preview")]}
+
+# names of output formats written for every footprint
+default_formats = ["kicad_mod", "inverted"]
+selected_formats = list(default_formats)
+
+
+def output_files(name: str) -> List[str]:
+    """
+    :param name: footprint name
+    :return: names of files written for footprint in selected formats
+    """
+    return [name + output_formats[f].suffix for f in selected_formats]
+
+
+def write_to_files(footprint: Footprint):
+    """
+    function creates files in selected formats (by default kicad_mod files: direct and inverted)
+    :param footprint: footprint to write
+    :return:
+    """
+    outputs = [(footprint.name + output_formats[f].suffix, output_formats[f].render(footprint))
+               for f in selected_formats]
+    with stage("write") as stats:
+        for filename, content in outputs:
+            write_atomic(filename, content)
+        stats.count(files=len(outputs))
+
 
+@dataclass
+class Cache:
+    """
+    on-disk cache of converted files: folder/<key>/footprints.json contains geometry of footprints,
+    files in all formats are created from it,
+    key is hash of project file content, converter source, footprint name and conversion options
+    entries are removed in least recently used order when folder is bigger than size (bytes)
+    """
+    folder: str = default_cache_folder
+    size: int = 200 * 1024 * 1024
+
+    def key(self, filename: str, name: str, legacy: bool = False) -> str:
+        """
+        gets cache key for file
+        :param filename: name of hfss file
+        :param name: footprint name
+        :param legacy: conversion with regexp json rules
+        :return: key
+        """
+        h = file_hash(filename)
+        h.update(json.dumps([converter_hash(), name, legacy, deg_delta, chord_tolerance, max_arc_points,
+                             design_patterns, part_patterns, split_parts,
+                             getattr(parameters_hook, "__name__", None), simplify_tolerance]).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Footprint]]:
+        """
+        reads cached footprints
+        :param key: cache key
+        :return: list of footprints or None if they are not in cache
+        """
+        entry = os.path.join(self.folder, key)
+        try:
+            with open(os.path.join(entry, "footprints.json")) as f:
+                res = [footprint_from_dict(data) for data in json.load(f)]
+            os.utime(entry)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return res
+
+    def put(self, key: str, footprints: List[Footprint]):
+        """
+        saves footprints to cache and removes old entries if cache is too big
+        :param key: cache key
+        :param footprints: converted footprints
+        :return:
+        """
+        entry = os.path.join(self.folder, key)
+        temp = "%s.%s.tmp" % (entry, uuid.uuid4().hex[:8])
+        try:
+            os.makedirs(temp)
+            with open(os.path.join(temp, "footprints.json"), "w") as f:
+                json.dump([geometry_dict(footprint) for footprint in footprints], f)
+            os.replace(temp, entry)
+        except OSError:
+            shutil.rmtree(temp, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        removes least recently used entries while cache is bigger than size
+        :return:
+        """
+        entries = []
+        for key in os.listdir(self.folder):
+            if key.endswith(".tmp"):
+                continue
+            entry = os.path.join(self.folder, key)
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def file_hash(filename: str) -> Any:
+    """
+    hashes file content in chunks, so file is not read to memory whole
+    :param filename: name of file
+    :return: sha256 hash object
+    """
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h
+
+
+@functools.lru_cache()
+def converter_hash() -> str:
+    """
+    gets hash of converter source, so cached files are not used after converter changes
+    :return: hash
+    """
+    with open(os.path.abspath(__file__), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def convert_to_files(filename: str, legacy: bool = False, cache: Cache = None) -> Tuple[List[str], bool]:
+    """
+    converts hfss file to kicad_mod files for designs and parts selected with set_options,
+    files are taken from cache if possible
+    :param filename: name of hfss file
+    :param legacy: use regexp json conversion instead of parser
+    :param cache: cache for converted files or None
+    :return: footprint names and True if files were taken from cache
+    """
+    name = source_name(filename)
+    key = None
+    footprints = None
+    if cache is not None:
+        key = cache.key(filename, name, legacy)
+        footprints = cache.get(key)
+    cached = footprints is not None
+    if not cached:
+        footprints = convert_all(filename, name, legacy, design_patterns, part_patterns, split_parts)
+    for footprint in footprints:
+        write_to_files(footprint)
+    if key is not None and not cached:
+        cache.put(key, footprints)
+    return [footprint.name for footprint in footprints], cached
+
+
+def main(filename: str, legacy: bool = False, cache: Cache = None, sweep: str = None) -> bool:
+    """
+    converts hfss file to kicad_mod files
+    :param filename: name of hfss file
+    :param legacy: use regexp json conversion instead of parser
+    :param cache: cache for converted files or None
+    :param sweep: csv file with variable sets, footprint is created for every set (cache is not used)
+    :return: True if files created
+    """
     try:
-        res, arc, points = get_coordinates(filename)
+        if sweep:
+            names, cached = sweep_to_files(filename, read_sweep(sweep), legacy), False
+        else:
+            names, cached = convert_to_files(filename, legacy, cache)
+    except FileNotFoundError as e:
+        print("File %s not found" % (e.filename or filename))
+        return False
     except json.decoder.JSONDecodeError:
         print("Json failed")
         return False
+    except KeyError as e:
+        print("Geometry not found: %s" % e)
+        return False
+    except ExpressionError as e:
+        print("Expression failed: %s" % e)
+        return False
+    except (ValueError, ArithmeticError) as e:
+        print("Conversion failed: %s" % e)
+        return False
 
-    remove(filename + '.json')
-
-    new_keys = sorted(res.keys())
-    new_res = {}
-    for key in new_keys:
-        new_res[key] = res[key]
-    write_to_files(filename, new_res, arc, points)
-    print("%s.kicad_mod created, %s_inverted.kicad_mod created" % (filename, filename))
+    status = "taken from cache" if cached else "created"
+    for name in names:
+        print(", ".join("%s %s" % (filename, status) for filename in output_files(name)))
     return True
 
 
+def set_options(tolerance: float = None, max_points: int = None, profile: bool = False,
+                designs: List[str] = None, parts: List[str] = None, split: bool = False, parameters: bool = True,
+                simplify: float = None, formats: List[str] = None):
+    """
+    sets options for conversion (also used as initializer for worker processes)
+    :param tolerance: max chord deviation for arcs in mm
+    :param max_points: max number of points for one arc
+    :param profile: collect stage statistics
+    :param designs: design name patterns, None for all designs
+    :param parts: part name patterns, None for all parts
+    :param split: footprint for every part
+    :param parameters: change parametric points with add_parameters_value
+    :param simplify: tolerance in mm for simplification of polygons, None: no simplification
+    :param formats: names of output formats, None: kicad_mod and inverted
+    :return:
+    """
+    global chord_tolerance, max_arc_points, design_patterns, part_patterns, split_parts, parameters_hook
+    global simplify_tolerance, selected_formats
+    if simplify is not None and not simplify > 0:
+        raise ValueError("simplification tolerance must be positive: %s" % simplify)
+    for name in formats or ():
+        if name not in output_formats:
+            raise ValueError("unknown output format: %s" % name)
+        if name == "npz" and np is None:
+            raise ValueError("npz format needs numpy")
+    chord_tolerance = tolerance
+    max_arc_points = max_points
+    design_patterns = designs
+    part_patterns = parts
+    split_parts = split
+    parameters_hook = add_parameters_value if parameters else None
+    simplify_tolerance = simplify
+    selected_formats = list(formats or default_formats)
+    set_profiling(profile)
+
+
+def get_options() -> tuple:
+    """
+    :return: arguments of set_options for current options (to set them in worker processes)
+    """
+    return (chord_tolerance, max_arc_points, profiling, design_patterns, part_patterns, split_parts,
+            parameters_hook is not None, simplify_tolerance, selected_formats)
+
+
+def find_projects(paths: List[str]) -> List[str]:
+    """
+    gets list of project files from files, folders and glob patterns
+    :param paths: list of files, folders (hfss and aedt files in folder are taken) and glob patterns
+    :return: sorted list of files for every path without repeats
+    """
+    res: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                     if os.path.splitext(f)[1].lower() in project_extensions]
+        elif any(c in path for c in '*?['):
+            found = sorted(glob.glob(path))
+        else:
+            found = [path]
+        res.extend(f for f in found if f not in res)
+    return res
+
+
+@dataclass
+class ConversionResult:
+    filename: str
+    ok: bool
+    time: float
+    error: str = ""
+    cached: bool = False
+    profile: List[Dict[str, Any]] = None
+    footprints: List[str] = None
+
+
+def convert_file(filename: str, legacy: bool = False, cache: Cache = None) -> ConversionResult:
+    """
+    converts hfss file to kicad_mod files without printing, errors are returned in result
+    :param filename: name of hfss file
+    :param legacy: use regexp json conversion instead of parser
+    :param cache: cache for converted files or None
+    :return: conversion result
+    """
+    global stages
+    saved, stages = stages, dict()
+    start = time.perf_counter()
+    try:
+        names, cached = convert_to_files(filename, legacy, cache)
+        res = ConversionResult(filename, True, time.perf_counter() - start, cached=cached, footprints=names)
+    except Exception as e:
+        res = ConversionResult(filename, False, time.perf_counter() - start, "%s: %s" % (type(e).__name__, e))
+    finally:
+        stages, saved = saved, stages
+    if profiling:
+        res.profile = [asdict(s) for s in saved.values()]
+    return res
+
+
+def convert_files(filenames: List[str], jobs: int = 1, legacy: bool = False,
+                  cache: Cache = None) -> List[ConversionResult]:
+    """
+    converts several hfss files in parallel processes
+    :param filenames: list of hfss files
+    :param jobs: number of processes
+    :param legacy: use regexp json conversion instead of parser
+    :param cache: cache for converted files or None
+    :return: results in the same order as filenames (stage statistics of all files are added to stages)
+    """
+    if jobs <= 1 or len(filenames) < 2:
+        res = [convert_file(filename, legacy, cache) for filename in filenames]
+    else:
+        res = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=set_options, initargs=get_options()) as executor:
+            futures = [executor.submit(convert_file, filename, legacy, cache) for filename in filenames]
+            for filename, future in zip(filenames, futures):
+                try:
+                    res.append(future.result())
+                except Exception as e:
+                    res.append(ConversionResult(filename, False, 0, "%s: %s" % (type(e).__name__, e)))
+    for r in res:
+        if r.profile:
+            add_profile(r.profile)
+    return res
+
+
+def print_summary(results: List[ConversionResult]):
+    """
+    prints table with conversion results
+    :param results: list of conversion results
+    :return:
+    """
+    width = max([len(r.filename) for r in results] + [4])
+    print("%-*s %-7s %8s" % (width, "file", "status", "time, s"))
+    for r in results:
+        status = "failed" if not r.ok else "cached" if r.cached else "ok"
+        print(("%-*s %-7s %8.2f  %s" % (width, r.filename, status, r.time, r.error)).rstrip())
+    failed = sum(1 for r in results if not r.ok)
+    print("%d files: %d converted, %d failed, %.2f s" % (len(results), len(results) - failed, failed,
+                                                          sum(r.time for r in results)))
+
+
+def write_profile(filename: str, results: List[ConversionResult] = None):
+    """
+    writes json report with stage statistics: total and for every file
+    :param filename: name of json file
+    :param results: conversion results with stage statistics
+    :return:
+    """
+    report = {"stages": profile_report(),
+              "files": [{"filename": r.filename, "ok": r.ok, "time": r.time, "cached": r.cached, "error": r.error,
+                         "stages": r.profile or []} for r in results or []]}
+    write_atomic(filename, json.dumps(report, indent=2))
+
+
+@dataclass
+class WatchedFile:
+    """
+    state of watched project: size and modification time, content hash and footprints of the last conversion
+    """
+    signature: Tuple[int, int] = None
+    changed: float = -math.inf
+    pending: bool = True
+    digest: str = None
+    footprints: Dict[str, Footprint] = field(default_factory=dict)
+    tessellation: TessellationCache = field(default_factory=TessellationCache)
+
+
+@dataclass
+class Watcher:
+    """
+    polls project files, folders and glob patterns, file is converted when it is not changed for debounce seconds
+    and its content hash differs from the last conversion, only changed arcs are tessellated
+    and only changed footprints are written
+    """
+    paths: List[str]
+    legacy: bool = False
+    interval: float = 0.5
+    debounce: float = 1.0
+    files: Dict[str, WatchedFile] = field(default_factory=dict)
+    polled: bool = False
+
+    def poll(self, now: float = None) -> List[ConversionResult]:
+        """
+        checks watched files once
+        :param now: current time (time.monotonic() by default)
+        :return: results of conversions
+        """
+        now = time.monotonic() if now is None else now
+        res = []
+        found = set()
+        for filename in find_projects(self.paths):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            found.add(filename)
+            if filename not in self.files:
+                # files found at start are converted at once, new files can be still written
+                self.files[filename] = WatchedFile(changed=now if self.polled else -math.inf)
+            state = self.files[filename]
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature != state.signature:
+                if state.signature is not None:
+                    state.changed = now
+                state.signature = signature
+                state.pending = True
+            if state.pending and now - state.changed >= self.debounce:
+                state.pending = False
+                result = self.convert(filename, state)
+                if result is not None:
+                    res.append(result)
+        for filename in set(self.files) - found:
+            del self.files[filename]
+        self.polled = True
+        return res
+
+    def convert(self, filename: str, state: WatchedFile) -> Optional[ConversionResult]:
+        """
+        converts file if its content is changed
+        :param filename: name of hfss file
+        :param state: state of file
+        :return: conversion result or None if content is not changed
+        """
+        global tessellation_cache
+        start = time.perf_counter()
+        try:
+            digest = file_hash(filename).hexdigest()
+        except OSError as e:
+            return ConversionResult(filename, False, time.perf_counter() - start, "%s: %s" % (type(e).__name__, e))
+        if digest == state.digest:
+            return None
+        state.digest = digest
+        saved, tessellation_cache = tessellation_cache, state.tessellation
+        try:
+            # file is converted from path (mapped to memory), if it is saved again meanwhile its signature changes
+            # and it is converted again after debounce
+            footprints = convert_all(filename, source_name(filename), self.legacy, design_patterns, part_patterns,
+                                     split_parts)
+        except Exception as e:
+            return ConversionResult(filename, False, time.perf_counter() - start, "%s: %s" % (type(e).__name__, e))
+        finally:
+            tessellation_cache = saved
+            state.tessellation.next_run()
+        written = []
+        for footprint in footprints:
+            if (state.footprints.get(footprint.name) != footprint or
+                    not all(os.path.exists(filename) for filename in output_files(footprint.name))):
+                write_to_files(footprint)
+                written.append(footprint.name)
+        state.footprints = {footprint.name: footprint for footprint in footprints}
+        return ConversionResult(filename, True, time.perf_counter() - start, footprints=written)
+
+    def run(self):
+        """
+        polls files until Ctrl+C and prints results
+        :return:
+        """
+        print("Watching %s, press Ctrl+C to stop" % ", ".join(self.paths))
+        try:
+            while True:
+                for r in self.poll():
+                    if not r.ok:
+                        print("%s failed: %s" % (r.filename, r.error))
+                    elif r.footprints:
+                        print("%s converted in %.2f s: %s" % (r.filename, r.time, ", ".join(
+                            filename for name in r.footprints for filename in output_files(name))))
+                    else:
+                        print("%s converted in %.2f s: footprints are not changed" % (r.filename, r.time))
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def convert_upload(content: bytes, name: str, legacy: bool = False) -> List[Dict[str, Any]]:
+    """
+    converts project content to footprints in selected formats (used by server in worker processes)
+    :param content: hfss file content
+    :param name: base footprint name
+    :param legacy: use regexp json conversion instead of parser
+    :return: list with name and dict with content for every format (base64 for binary formats)
+    """
+    res = []
+    for footprint in convert_all(content, name, legacy, design_patterns, part_patterns, split_parts):
+        outputs = {}
+        for f in selected_formats:
+            output = output_formats[f].render(footprint)
+            outputs[f] = base64.b64encode(output).decode() if isinstance(output, bytes) else output
+        res.append({"name": footprint.name, "formats": outputs})
+    return res
+
+
+class Server:
+    """
+    local conversion service: http requests on localhost or on unix socket are converted in warm worker processes
+      POST /convert with json {"path": "file.aedt", "legacy": false}: files are created near project,
+      POST /convert?name=footprint with project in body: footprints are returned in selected formats,
+      GET /status: counters of requests
+    at most jobs requests are converted at once, requests are rejected (503) if max_queue requests wait,
+    on stop new connections are not accepted and started requests are finished
+    """
+
+    def __init__(self, jobs: int = 1, legacy: bool = False, cache: Cache = None, max_queue: int = 16,
+                 max_body: int = 1 << 30, shutdown_timeout: float = 60):
+        self.jobs = jobs
+        self.legacy = legacy
+        self.cache = cache
+        self.max_queue = max_queue
+        self.max_body = max_body
+        self.shutdown_timeout = shutdown_timeout
+        self.counters = {"waiting": 0, "active": 0, "done": 0, "failed": 0, "rejected": 0}
+        self.address = None
+        self.started = threading.Event()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stopped: Optional[asyncio.Event] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.tasks = set()
+
+    def stop(self):
+        """
+        stops server, can be called from any thread
+        :return:
+        """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def run(self, host: str = "127.0.0.1", port: int = 8765, path: str = None):
+        """
+        serves requests until SIGINT or SIGTERM
+        :return:
+        """
+        try:
+            asyncio.run(self.serve(host, port, path))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, path: str = None):
+        """
+        serves requests until stop
+        :param host: host for tcp server
+        :param port: port for tcp server, 0 for any free port
+        :param path: unix socket path, used instead of host and port if set
+        :return:
+        """
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.slots = asyncio.Semaphore(self.jobs)
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=set_options, initargs=get_options()) as executor:
+            self.executor = executor
+            await asyncio.gather(*(self.loop.run_in_executor(executor, os.getpid) for _ in range(self.jobs)))
+            if path:
+                server = await asyncio.start_unix_server(self.handle, path)
+            else:
+                server = await asyncio.start_server(self.handle, host, port)
+            self.address = path or server.sockets[0].getsockname()[:2]
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    self.loop.add_signal_handler(sig, self.stopped.set)
+                except (NotImplementedError, RuntimeError, ValueError):
+                    pass
+            print("Serving on %s with %d workers, Ctrl+C to stop" % (
+                path or "http://%s:%d" % tuple(self.address), self.jobs), flush=True)
+            self.started.set()
+            await self.stopped.wait()
+            server.close()
+            await server.wait_closed()
+            if self.tasks:
+                await asyncio.wait(self.tasks, timeout=self.shutdown_timeout)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        handles one http request, connection is closed after response
+        """
+        self.tasks.add(asyncio.current_task())
+        start = time.perf_counter()
+        try:
+            try:
+                status, response = await self.respond(reader)
+            except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+                status, response = HTTPStatus.BAD_REQUEST, {"error": "%s: %s" % (type(e).__name__, e)}
+            response.setdefault("time", {})["total"] = time.perf_counter() - start
+            body = json.dumps(response).encode()
+            writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                         b"Connection: close\r\n\r\n" % (status, status.phrase.encode(), len(body)) + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.tasks.discard(asyncio.current_task())
+
+    async def respond(self, reader: asyncio.StreamReader) -> Tuple[HTTPStatus, Dict[str, Any]]:
+        """
+        reads request and gets response
+        :return: http status and json response
+        """
+        method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if not line.strip():
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "max size is %d bytes" % self.max_body}
+        body = await reader.readexactly(length)
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == "/status" and method == "GET":
+            return HTTPStatus.OK, {"jobs": self.jobs, "max_queue": self.max_queue, **self.counters}
+        if url.path != "/convert":
+            return HTTPStatus.NOT_FOUND, {"error": "unknown path %s" % url.path}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}
+        if headers.get("content-type", "").startswith("application/json"):
+            request = json.loads(body)
+            if not isinstance(request, dict) or not isinstance(request.get("path"), str):
+                return HTTPStatus.BAD_REQUEST, {"error": "path is not set"}
+            return await self.convert(convert_file, request["path"], bool(request.get("legacy", self.legacy)),
+                                      self.cache)
+        legacy = query.get("legacy", str(self.legacy)).lower() in ("1", "true", "yes")
+        return await self.convert(convert_upload, body, query.get("name", "footprint"), legacy)
+
+    async def convert(self, job: Callable, *args) -> Tuple[HTTPStatus, Dict[str, Any]]:
+        """
+        runs conversion in worker process when worker is free
+        :param job: convert_file or convert_upload
+        :param args: job arguments
+        :return: http status and json response
+        """
+        if self.counters["waiting"] >= self.max_queue or self.stopped.is_set():
+            self.counters["rejected"] += 1
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "queue is full" if not self.stopped.is_set() else
+                                                    "server is stopping"}
+        queued = time.perf_counter()
+        self.counters["waiting"] += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.counters["waiting"] -= 1
+        started = time.perf_counter()
+        self.counters["active"] += 1
+        try:
+            result = await self.loop.run_in_executor(self.executor, job, *args)
+            error = None if not isinstance(result, ConversionResult) or result.ok else result.error
+        except Exception as e:
+            result, error = None, "%s: %s" % (type(e).__name__, e)
+        finally:
+            self.counters["active"] -= 1
+            self.slots.release()
+        self.counters["failed" if error else "done"] += 1
+        response: Dict[str, Any] = {"ok": error is None, "time": {"queue": started - queued,
+                                                                  "convert": time.perf_counter() - started}}
+        if error:
+            response["error"] = error
+        elif isinstance(result, ConversionResult):
+            response.update(cached=result.cached, footprints=result.footprints,
+                            files=[filename for name in result.footprints for filename in output_files(name)])
+        else:
+            response["footprints"] = result
+        return (HTTPStatus.UNPROCESSABLE_ENTITY if error else HTTPStatus.OK), response
+
+
+def positive_float(text: str) -> float:
+    """
+    argument type for tolerances
+    :param text: argument
+    :return: value
+    """
+    value = float(text)
+    if not value > 0:
+        raise argparse.ArgumentTypeError("must be positive: %s" % text)
+    return value
+
+
+def positive_int(text: str) -> int:
+    """
+    argument type for numbers of points
+    :param text: argument
+    :return: value
+    """
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError("must be positive: %s" % text)
+    return value
+
+
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        main(sys.argv[1])
+    parser = argparse.ArgumentParser(description="converts hfss/aedt projects to kicad_mod footprints")
+    parser.add_argument("paths", nargs="*", metavar="path", help="hfss or aedt files, folders or glob patterns")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="number of parallel processes (0: number of cpus)")
+    parser.add_argument("--legacy", action="store_true", help="use regexp json conversion instead of parser")
+    parser.add_argument("--tolerance", type=positive_float,
+                        help="max chord deviation for arcs in mm (instead of %s deg steps)" % deg_delta)
+    parser.add_argument("--max-arc-points", type=positive_int, help="max number of points for one arc")
+    parser.add_argument("--design", action="append", metavar="PATTERN",
+                        help="convert designs with matching names (default: all designs, footprint for every design)")
+    parser.add_argument("--part", action="append", metavar="PATTERN",
+                        help="use parts with matching names (default: all parts)")
+    parser.add_argument("--split-parts", action="store_true", help="create footprint for every part")
+    parser.add_argument("--no-parameters", action="store_true",
+                        help="do not change parametric polyline points with add_parameters_value")
+    parser.add_argument("--format", action="append", choices=list(output_formats), dest="formats",
+                        help="output format, can be repeated: %s (default: kicad_mod and inverted)" % ", ".join(
+                            "%s - %s" % (f.name, f.description) for f in output_formats.values()))
+    parser.add_argument("--simplify", type=positive_float, metavar="TOLERANCE",
+                        help="remove repeated and collinear points and merge touching rectangles, tolerance in mm")
+    parser.add_argument("--sweep", metavar="CSV",
+                        help="csv file with variable names in header, footprint <name>_<row> is created for every row")
+    parser.add_argument("--watch", action="store_true", help="convert files again when they are saved")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="watch polling interval in s (default: %(default)s)")
+    parser.add_argument("--debounce", type=float, default=1.0,
+                        help="convert file when it is not changed for this time in s (default: %(default)s)")
+    parser.add_argument("--serve", action="store_true",
+                        help="run conversion service: POST /convert with json {\"path\": file} or with file content")
+    parser.add_argument("--host", default="127.0.0.1", help="service host (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="service port (default: %(default)s)")
+    parser.add_argument("--socket", help="unix socket for service instead of host and port")
+    parser.add_argument("--max-queue", type=int, default=16,
+                        help="max number of requests waiting for workers (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="convert files even if they are in cache")
+    parser.add_argument("--cache-dir", default=default_cache_folder, help="cache folder (default: %(default)s)")
+    parser.add_argument("--cache-size", type=float, default=200, help="max cache size in MB (default: %(default)s)")
+    parser.add_argument("--rule-stats", action="store_true",
+                        help="print regexp rules statistics (with --legacy, for files converted in main process)")
+    parser.add_argument("--profile", action="store_true", help="print time, memory and items of conversion stages")
+    parser.add_argument("--profile-json", metavar="FILE", help="write stage statistics to json file")
+    args = parser.parse_args()
+    if not args.paths and not args.serve:
+        parser.error("paths are required")
+    try:
+        set_options(args.tolerance, args.max_arc_points, args.profile or bool(args.profile_json), args.design,
+                    args.part, args.split_parts, not args.no_parameters, args.simplify, args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+    results = None
+    cache = None if args.no_cache else Cache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+    filenames = find_projects(args.paths)
+    if args.serve:
+        Server(args.jobs or os.cpu_count(), args.legacy, cache, args.max_queue).run(args.host, args.port, args.socket)
+        ok = True
+    elif args.watch:
+        Watcher(args.paths, args.legacy, args.interval, args.debounce).run()
+        ok = True
+    elif len(args.paths) == 1 and filenames == args.paths:
+        ok = main(filenames[0], legacy=args.legacy, cache=cache, sweep=args.sweep)
+    elif args.sweep:
+        print("Sweep needs one hfss file")
+        ok = False
+    elif filenames:
+        results = convert_files(filenames, args.jobs or os.cpu_count(), args.legacy, cache)
+        print_summary(results)
+        ok = all(r.ok for r in results)
     else:
-        print("File name required")
+        print("No hfss files found")
+        ok = False
+    if args.rule_stats:
+        print_rule_stats()
+    if args.profile:
+        print_profile()
+    if args.profile_json:
+        write_profile(args.profile_json, results)
+    sys.exit(0 if ok else 1)
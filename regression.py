@@ -0,0 +1,230 @@
+"""
+golden output regression for hfsstokicad: footprints of sample projects (generated with benchmark) are compared
+with stored golden outputs within numeric tolerance, vertex count and throughput changes are reported
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Any, Dict, Optional
+
+import benchmark
+import hfsstokicad
+
+KB = 1024
+
+# folder with golden outputs, one json file for every sample
+default_golden_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+# max difference of coordinates in mm (kicad_mod files have 6 digits after point)
+default_tolerance = 2e-6
+
+polygon_start = "(fp_poly"
+
+
+@dataclass
+class Sample:
+    name: str
+    project: benchmark.SyntheticProject
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+corpus = [
+    Sample("rectangles", benchmark.SyntheticProject(32 * KB, 0.5, 1000, 4, 0.5)),
+    Sample("polylines", benchmark.SyntheticProject(32 * KB, 0.5, 3, 4, 0.5), {"tolerance": 0.001}),
+    Sample("arcs", benchmark.SyntheticProject(32 * KB, 0.3, 2, 8, 1), {"tolerance": 0.001, "max_points": 16}),
+    Sample("embedded", benchmark.SyntheticProject(128 * KB, 0.2, 5, 4, 0.5, 0.5)),
+    Sample("simplified", benchmark.SyntheticProject(32 * KB, 0.5, 3, 4, 0.5), {"simplify": 0.0005})]
+
+
+def normalize(text: str) -> List[List[float]]:
+    """
+    gets polygons from kicad_mod text, so footprint name and number formatting are not compared
+    :param text: kicad_mod text
+    :return: list of polygons: flat coordinates x0, y0, x1, y1...
+    """
+    res = []
+    for polygon in text.split(polygon_start)[1:]:
+        points = polygon[:polygon.index("(layer")].replace("(", " ").replace(")", " ").split()
+        res.append([float(value) for value in points if value not in ("pts", "xy")])
+    return res
+
+
+def mirror(polygons: List[List[float]]) -> List[List[float]]:
+    """
+    :return: polygons mirrored by x as in inverted kicad_mod file
+    """
+    return [[-c if k % 2 == 0 else c for k, c in enumerate(polygon)] for polygon in polygons]
+
+
+def compare(golden: List[List[float]], polygons: List[List[float]], tolerance: float) -> str:
+    """
+    compares polygons within tolerance
+    :param golden: golden polygons
+    :param polygons: new polygons
+    :param tolerance: max difference of coordinates in mm
+    :return: description of the first difference or empty string
+    """
+    if len(golden) != len(polygons):
+        return "%d polygons instead of %d" % (len(polygons), len(golden))
+    for number, (old, new) in enumerate(zip(golden, polygons)):
+        if len(old) != len(new):
+            return "polygon %d: %d vertices instead of %d" % (number, len(new) // 2, len(old) // 2)
+        for k, (a, b) in enumerate(zip(old, new)):
+            if abs(a - b) > tolerance:
+                return "polygon %d, vertex %d: %s %g instead of %g" % (number, k // 2, "xy"[k % 2], b, a)
+    return ""
+
+
+def convert_sample(filename: str, sample: Sample, legacy: bool = False,
+                   repeat: int = 1) -> (hfsstokicad.Footprint, float):
+    """
+    converts sample project in memory with sample options
+    :return: footprint and best time of repeat runs
+    """
+    hfsstokicad.set_options(**sample.options)
+    try:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            footprint = hfsstokicad.convert(filename, sample.name, legacy=legacy)
+            footprint.texts  # kicad_mod texts are rendered lazily
+            duration = time.perf_counter() - start
+            best = duration if best is None else min(best, duration)
+    finally:
+        hfsstokicad.set_options()
+    return footprint, best
+
+
+def golden_filename(folder: str, sample: Sample) -> str:
+    return os.path.join(folder, sample.name + ".json")
+
+
+def load_golden(folder: str, sample: Sample) -> Optional[Dict[str, Any]]:
+    """
+    :return: golden output of sample or None if it is not stored
+    """
+    try:
+        with open(golden_filename(folder, sample)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def store_golden(folder: str, sample: Sample, golden: Dict[str, Any]):
+    """
+    writes golden output, every polygon in own line
+    """
+    lines = ["{"]
+    for key, value in golden.items():
+        if key != "polygons":
+            lines.append(" %s: %s," % (json.dumps(key), json.dumps(value)))
+    lines.append(' "polygons": [')
+    lines.append(",\n".join("  " + json.dumps(polygon) for polygon in golden["polygons"]))
+    lines.append(" ]\n}\n")
+    os.makedirs(folder, exist_ok=True)
+    hfsstokicad.write_atomic(golden_filename(folder, sample), "\n".join(lines))
+
+
+def count_lines(filename: str) -> int:
+    with open(filename, "rb") as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+
+def check_sample(sample: Sample, data_folder: str = benchmark.default_data_folder,
+                 golden_folder: str = default_golden_folder, legacy: bool = False, repeat: int = 1,
+                 tolerance: float = default_tolerance, update: bool = False) -> Dict[str, Any]:
+    """
+    converts sample and compares direct and inverted outputs with golden output
+    :param sample: sample project and options
+    :param data_folder: folder for generated projects
+    :param golden_folder: folder with golden outputs
+    :param legacy: use regexp json conversion instead of parser
+    :param repeat: number of runs for time
+    :param tolerance: max difference of coordinates in mm
+    :param update: store new golden output (and throughput for parser) instead of comparing
+    :return: result with error (empty if outputs are the same), vertex counts and throughput
+    """
+    filename = benchmark.get_project(data_folder, sample.project)
+    footprint, duration = convert_sample(filename, sample, legacy, repeat)
+    polygons = normalize(footprint.text)
+    vertices = sum(len(polygon) // 2 for polygon in polygons)
+    lines = count_lines(filename)
+    throughput = {"lines_per_s": lines / duration, "points_per_s": vertices / duration}
+    parser = "legacy" if legacy else "new"
+    golden = load_golden(golden_folder, sample)
+    if update:
+        same = golden is not None and golden["polygons"] == polygons
+        golden = {"project": asdict(sample.project), "options": sample.options, "lines": lines, "vertices": vertices,
+                  "throughput": dict(golden["throughput"] if same else {}, **{parser: throughput}),
+                  "polygons": polygons}
+        store_golden(golden_folder, sample, golden)
+    res = {"name": sample.name, "legacy": legacy, "time": duration, "lines": lines, "vertices": vertices,
+           "golden_vertices": None, "golden_throughput": {}, "error": "", **throughput}
+    if golden is None:
+        res["error"] = "golden output not found"
+        return res
+    res["golden_vertices"] = golden["vertices"]
+    res["golden_throughput"] = golden["throughput"].get(parser, {})
+    if golden["project"] != asdict(sample.project) or golden["options"] != sample.options:
+        res["error"] = "golden output is for other project or options"
+    else:
+        inverted = compare(mirror(golden["polygons"]), normalize(footprint.inverted_text), tolerance)
+        res["error"] = compare(golden["polygons"], polygons, tolerance) or (inverted and "inverted: " + inverted)
+    return res
+
+
+def run_corpus(samples: List[Sample] = None, legacy: bool = False, **kwargs) -> List[Dict[str, Any]]:
+    """
+    checks samples with parser (and with legacy conversion)
+    :param samples: samples, all corpus by default
+    :param legacy: check legacy conversion too
+    :param kwargs: arguments of check_sample
+    :return: results
+    """
+    return [check_sample(sample, legacy=parser, **kwargs) for sample in samples or corpus
+            for parser in ([False, True] if legacy else [False])]
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """
+    prints table with results and changes from golden outputs
+    :param results: results of check_sample
+    :return:
+    """
+    print("%-12s %-7s %-7s %9s %9s %12s %9s %12s %9s" % ("sample", "parser", "status", "vertices", "delta",
+                                                       "lines/s", "delta", "points/s", "delta"))
+    for res in results:
+        golden = res["golden_throughput"]
+        vertices = res["vertices"] - res["golden_vertices"] if res["golden_vertices"] is not None else None
+        print(("%-12s %-7s %-7s %9d %9s %12.0f %9s %12.0f %9s  %s" % (
+            res["name"], "legacy" if res["legacy"] else "new", "failed" if res["error"] else "ok", res["vertices"],
+            "" if vertices is None else "%+d" % vertices, res["lines_per_s"],
+            benchmark.delta(res["lines_per_s"], golden.get("lines_per_s")), res["points_per_s"],
+            benchmark.delta(res["points_per_s"], golden.get("points_per_s")), res["error"])).rstrip())
+    failed = sum(1 for res in results if res["error"])
+    print("%d samples: %d same as golden outputs, %d failed" % (len(results), len(results) - failed, failed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="compares hfsstokicad outputs of sample projects with golden outputs")
+    parser.add_argument("samples", nargs="*", help="names of samples (default: all): %s" % ", ".join(
+        sample.name for sample in corpus))
+    parser.add_argument("--update", action="store_true", help="store current outputs as golden outputs")
+    parser.add_argument("--legacy", action="store_true", help="check regexp json conversion too")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs for time (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=default_tolerance,
+                        help="max difference of coordinates in mm (default: %(default)s)")
+    parser.add_argument("--data-dir", default=benchmark.default_data_folder, help="folder for generated projects")
+    parser.add_argument("--golden-dir", default=default_golden_folder, help="folder with golden outputs")
+    args = parser.parse_args()
+    unknown = set(args.samples) - {sample.name for sample in corpus}
+    if unknown:
+        parser.error("unknown samples: %s" % ", ".join(sorted(unknown)))
+    results = run_corpus([sample for sample in corpus if sample.name in args.samples] or None, args.legacy,
+                         data_folder=args.data_dir, golden_folder=args.golden_dir, repeat=args.repeat,
+                         tolerance=args.tolerance, update=args.update)
+    print_report(results)
+    sys.exit(1 if any(res["error"] for res in results) else 0)
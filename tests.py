@@ -1,6 +1,208 @@
 import hfsstokicad
+import benchmark
+import regression
 import unittest
+import contextlib
+import io
+import math
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import http.client
+import time
+
+# minimal project: one rectangle, one port (excluded), one polyline with arcs
+SAMPLE_PROJECT = """$begin 'AnsoftProject'
+\tCreated='Wed Jun 13 10:56:15 2018'
+\t$begin 'Desktop'
+\t\tVersion(2018, 0)
+\t$end 'Desktop'
+\t$begin 'HFSSModel'
+\t\tName='HFSSDesign1'
+\t\t$begin 'ModelSetup'
+\t\t\t$begin 'Properties'
+\t\t\t\tVariableProp('W2', 'UD', '', '1.5mm')
+\t\t\t\tVariableProp('Angle', 'UD', '', '30deg')
+\t\t\t$end 'Properties'
+\t\t\t$begin 'GeometryCore'
+\t\t\t\t$begin 'GeometryOperations'
+\t\t\t\t\t$begin 'AnsoftRangedIDServer'
+\t\t\t\t\t\tIDServer=1000
+\t\t\t\t\t$end 'AnsoftRangedIDServer'
+\t\t\t\t\tGeometryEntityListIDs[0:]
+\t\t\t\t\t$begin 'ToplevelParts'
+%(rect1)s%(port)s%(polyline)s\t\t\t\t\t$end 'ToplevelParts'
+\t\t\t\t\t$begin 'OperandParts'
+%(rect2)s\t\t\t\t\t$end 'OperandParts'
+\t\t\t\t$end 'GeometryOperations'
+\t\t\t$end 'GeometryCore'
+\t\t$end 'ModelSetup'
+\t\t$begin 'ReportSetup'
+\t\t\t$begin 'Reports'
+\t\t\t\t$begin 'S Parameter Plot 1'
+\t\t\t\t\tName='max(dB(S(1,1)))'
+\t\t\t\t$end 'S Parameter Plot 1'
+\t\t\t$end 'Reports'
+\t\t$end 'ReportSetup'
+\t$end 'HFSSModel'
+$end 'AnsoftProject'
+$begin 'ProjectPreview'
+\tThumbnail64='/9j/4AAQSkZJRgABAQEAYABgAAD'
+$end 'ProjectPreview'
+"""
+
+RECTANGLE = """$begin 'GeometryPart'
+$begin 'Attributes'
+Name='%s'
+Color='(132 132 193)'
+MaterialValue='"copper"'
+SolveInside=false
+$end 'Attributes'
+$begin 'Operations'
+$begin 'Operation'
+OperationType='CoverLines'
+ID=5
+$begin 'OperationIdentity'
+BodyID=5
+$begin 'GeomTopolBasedOperationIdentityHelper'
+$begin 'NewFaces'
+$begin 'Face'
+ID=7
+$begin 'FaceGeomTopol'
+FaceTopol(1, 4, 4, 4)
+$begin 'FaceGeometry'
+Area=1.8
+$begin 'FcTolVts'
+TolVt(%s, %s, 0, 5e-07)
+TolVt(%s, %s, 0, 5e-07)
+TolVt(%s, %s, 0, 5e-07)
+TolVt(%s, %s, 0, 5e-07)
+$end 'FcTolVts'
+$end 'FaceGeometry'
+$end 'FaceGeomTopol'
+$end 'Face'
+$end 'NewFaces'
+$end 'GeomTopolBasedOperationIdentityHelper'
+FacesIDs[1: 7]
+$end 'OperationIdentity'
+$end 'Operation'
+$end 'Operations'
+$end 'GeometryPart'
+"""
+
+POLYLINE = """$begin 'GeometryPart'
+$begin 'Attributes'
+Name='Polyline1'
+$end 'Attributes'
+$begin 'Operations'
+$begin 'Operation'
+OperationType='Polyline'
+ID=30
+$begin 'PolylineParameters'
+IsPolylineCovered=true
+$begin 'PolylinePoints'
+$begin 'PLPoint'
+X='0mm'
+Y='0mm'
+$end 'PLPoint'
+$begin 'PLPoint'
+X='2mm'
+Y='0mm'
+$end 'PLPoint'
+$begin 'PLPoint'
+X='2mm'
+Y='1mm'
+$end 'PLPoint'
+$end 'PolylinePoints'
+$begin 'PolylineSegments'
+$begin 'PLSegment'
+SegmentType='Line'
+StartIndex=0
+NoOfPoints=2
+$end 'PLSegment'
+$begin 'PLSegment'
+SegmentType='AngularArc'
+StartIndex=1
+NoOfPoints=3
+NoOfSegments='0'
+ArcAngle='90deg'
+ArcCenterX='1mm'
+ArcCenterY='0mm'
+$end 'PLSegment'
+$begin 'PLSegment'
+SegmentType='AngularArc'
+StartIndex=2
+NoOfPoints=3
+NoOfSegments='0'
+ArcAngle='-Angle'
+ArcCenterX='1.5mm'
+ArcCenterY='1mm'
+$end 'PLSegment'
+$end 'PolylineSegments'
+$end 'PolylineParameters'
+$end 'Operation'
+$end 'Operations'
+$end 'GeometryPart'
+"""
+
+
+def sample_project() -> str:
+    return SAMPLE_PROJECT % dict(
+        rect1=RECTANGLE % ('Rectangle1', 13.32, 14.56, 15.12, 14.56, 15.12, 15.56, 13.32, 15.56),
+        port=RECTANGLE % ('Port', 0, 0, 1, 0, 1, 1, 0, 1),
+        polyline=POLYLINE,
+        rect2=RECTANGLE % ('Rectangle2', 1, 2, 3, 2, 3, 4, 1, 4))
+
+
+def two_design_project() -> str:
+    """
+    sample project with second design 'Design 2': two polylines and rectangle with other names
+    """
+    text = sample_project()
+    start, end = text.index("\t$begin 'HFSSModel'"), text.index("$end 'AnsoftProject'")
+    design = text[start:end].replace("Name='HFSSDesign1'", "Name='Design 2'").replace('Rectangle1', 'Pad')
+    design = design.replace(POLYLINE, POLYLINE + POLYLINE.replace('Polyline1', 'Polyline2'))
+    return text[:end] + design + text[end:]
+
+
+def hook_project() -> str:
+    """
+    sample project with variables and 17 polyline points used by add_parameters_value
+    """
+    text = sample_project().replace("\t\t\t\tVariableProp('Angle', 'UD', '', '30deg')\n", "".join(
+        "\t\t\t\tVariableProp('%s', 'UD', '', '%s')\n" % item for item in [
+            ('Angle', '30deg'), ('X02', '6.85mm+W2'), ('Y02', '1mm'), ('Y20', '5mm'), ('X20', '4mm'),
+            ('Y22', '1mm'), ('X22', '0.5mm')]))
+    points = "".join("$begin 'PLPoint'\nX='%dmm'\nY='1mm'\n$end 'PLPoint'\n" % k for k in range(3, 17))
+    return text.replace("$end 'PolylinePoints'", points + "$end 'PolylinePoints'")
+
+
+class FolderTest(unittest.TestCase):
+    """
+    test with temporary folder, options are reset after test
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'sample.hfss')
+
+    def tearDown(self):
+        hfsstokicad.set_options()
+        shutil.rmtree(self.folder)
+
+
+class SampleFolderTest(FolderTest):
+    """
+    test with sample project in temporary folder
+    """
+
+    def setUp(self):
+        super().setUp()
+        with open(self.filename, 'w') as f:
+            f.write(sample_project())
 
 
 class HFSSConvertionTest(unittest.TestCase):
@@ -18,5 +220,690 @@ class HFSSConvertionTest(unittest.TestCase):
                 self.assertTrue(res[filename])
 
 
+class RulesTest(unittest.TestCase):
+
+    def testStats(self):
+        hfsstokicad.reset_rule_stats()
+        rules = {rule.name: rule for rule in hfsstokicad.data_rules + hfsstokicad.string_rules}
+        self.assertEqual(hfsstokicad.string_handler('"IsSuppressed"=false'), '"IsSuppressed":false,')
+        self.assertEqual(hfsstokicad.data_correct('Color(R=1, G=2, B=3)'), 'Color({"R": 1}, {"G": 2}, {"B": 3})')
+        self.assertEqual((rules['rule11'].calls, rules['rule11'].hits), (1, 1))
+        self.assertEqual((rules['rule23'].calls, rules['rule23'].hits), (1, 1))
+        self.assertEqual(rules['rule13'].calls, 0)
+        hfsstokicad.reset_rule_stats()
+        self.assertEqual(rules['rule23'].calls, 0)
+
+
+class ArcTest(unittest.TestCase):
+
+    @unittest.skipIf(hfsstokicad.np is None, "numpy is not installed")
+    def testArrayPoints(self):
+        points = hfsstokicad.Path([2, 0, 2, 1, 0.5, -3])
+        arcs = [hfsstokicad.Arc(type="line", startindex=0, number_of_point=2),
+                hfsstokicad.Arc(type="arc", startindex=1, number_of_point=3, angle=90, center_x=1, center_y=0),
+                hfsstokicad.Arc(type="arc", startindex=2, number_of_point=3, angle=-170.3, center_x=0, center_y=0.2),
+                hfsstokicad.Arc(type="arc", startindex=0, number_of_point=3, angle=0.05, center_x=1, center_y=1)]
+        for delta in [0.1, 1, 0.37]:
+            expected = hfsstokicad.get_points_for_arc(arcs, points, delta)
+            res = hfsstokicad.get_points_array(arcs, points, delta)
+            self.assertEqual(len(res), len(expected))
+            self.assertEqual(res, expected)
+
+    def testTolerance(self):
+        points = hfsstokicad.Path([10, 0, 0.1, 0])
+        arcs = [hfsstokicad.Arc(type="arc", startindex=0, number_of_point=3, angle=360, center_x=0, center_y=0),
+                hfsstokicad.Arc(type="arc", startindex=1, number_of_point=3, angle=-90, center_x=0, center_y=0)]
+        big = hfsstokicad.get_points_for_arc(arcs[:1], points, 0.1, tolerance=0.001)
+        self.assertLess(len(big), 600)
+        for k, p1 in enumerate(big):
+            p2 = big[(k + 1) % len(big)]
+            middle = math.hypot((p1.x + p2.x) / 2, (p1.y + p2.y) / 2)
+            self.assertLessEqual(10 - middle, 0.001 + 1e-9)
+        self.assertEqual(len(hfsstokicad.get_points_for_arc(arcs[1:], points, 0.1, tolerance=1)), 1)
+        self.assertEqual(len(hfsstokicad.get_points_for_arc(arcs, points, 0.1, max_points=100)), 100 + 100)
+        self.assertEqual(len(hfsstokicad.get_points_for_arc(arcs, points, 0.1, 0.001, max_points=100)), 100 + 6)
+        self.assertRaises(ValueError, hfsstokicad.get_points_for_arc, arcs, points, 0.1, tolerance=0)
+        self.assertRaises(ValueError, hfsstokicad.get_points_for_arc, arcs, points, 0.1, tolerance=-0.01)
+        self.assertRaises(ValueError, hfsstokicad.get_points_for_arc, arcs, points, 0.1, max_points=0)
+        if hfsstokicad.np is not None:
+            res = hfsstokicad.get_points_for_arc(arcs, points, 0.1, tolerance=0.001)
+            array = hfsstokicad.get_points_array(arcs, points, 0.1, tolerance=0.001)
+            self.assertEqual(array, res)
+
+    def testPath(self):
+        path = hfsstokicad.Path([0, 1, 2.5, -3])
+        self.assertEqual(len(path), 2)
+        self.assertEqual((path[1].x, path[-1].y), (2.5, -3))
+        path[0].x = 1
+        self.assertEqual(list(path.coords), [1, 1, 2.5, -3])
+        self.assertEqual(list(path.mirrored().coords), [-1, 1, -2.5, -3])
+        self.assertEqual(str(hfsstokicad.Path([0, 1]).mirrored().coords[0]), '-0.0')
+        self.assertEqual(str(hfsstokicad.Path([0, 1]).mirrored(signed_zero=False).coords[0]), '0.0')
+        rectangle = hfsstokicad.Path([3, 15.12, 14.56, 0, 3, 13.32, 14.56, 0], dims=4)
+        self.assertEqual(rectangle[1], [3, 13.32, 14.56, 0])
+        self.assertEqual(rectangle.columns(1, 2), hfsstokicad.Path([15.12, 14.56, 13.32, 14.56]))
+        with self.assertRaises(IndexError):
+            path[2]
+        if hfsstokicad.np is not None:
+            self.assertEqual(hfsstokicad.Path.from_array(path.as_array() * 2), hfsstokicad.Path([2, 2, 5, -6]))
+
+
+class SimplifyTest(unittest.TestCase):
+
+    def tearDown(self):
+        hfsstokicad.set_options()
+
+    def testSimplifyPath(self):
+        square = hfsstokicad.Path([0, 0, 1, -1e-4, 1, -1e-4, 2, 0, 2, 1, 2, 2, 1, 2, 0, 2, 0, 1, 0, 0])
+        self.assertEqual(hfsstokicad.simplify_path(square, 0.001), hfsstokicad.Path([0, 0, 2, 0, 2, 2, 0, 2]))
+        self.assertEqual(len(hfsstokicad.simplify_path(square, 1e-5)), 5)
+        self.assertRaises(ValueError, hfsstokicad.set_options, simplify=0)
+        self.assertRaises(ValueError, hfsstokicad.set_options, simplify=-1)
+        self.assertEqual(hfsstokicad.simplify_path(hfsstokicad.Path([0, 0, 1, 0, 1, 0, 0, 0]), 0.1),
+                         hfsstokicad.Path([0, 0, 1, 0, 1, 0, 0, 0]))
+        arcs = [hfsstokicad.Arc(type="arc", startindex=0, number_of_point=3, angle=360, center_x=0, center_y=0)]
+        circle = hfsstokicad.get_points_for_arc(arcs, hfsstokicad.Path([5, 0]), 0.1)
+        res = hfsstokicad.simplify_path(circle, 0.01)
+        self.assertLess(len(res), len(circle) / 10)
+        for k, p1 in enumerate(res):
+            p2 = res[(k + 1) % len(res)]
+            self.assertGreaterEqual(math.hypot((p1.x + p2.x) / 2, (p1.y + p2.y) / 2), 5 - 0.01)
+        if hfsstokicad.np is not None:
+            np, hfsstokicad.np = hfsstokicad.np, None
+            try:
+                self.assertEqual(hfsstokicad.simplify_path(circle, 0.01), res)
+                self.assertEqual(len(hfsstokicad.simplify_path(square, 0.001)), 4)
+            finally:
+                hfsstokicad.np = np
+
+    def testMergeRectangles(self):
+        def rectangle(x0, y0, x1, y1):
+            return hfsstokicad.Path([x0, y0, x1, y0, x1, y1, x0, y1])
+        merged = hfsstokicad.merge_rectangles([rectangle(0, 0, 1, 1), rectangle(1, 0, 2, 1.0000001)], 1e-6)
+        self.assertEqual(merged, [hfsstokicad.Path([0, 0, 2, 0, 2, 1, 0, 1])])
+        merged = hfsstokicad.merge_rectangles([rectangle(5, 5, 6, 6), rectangle(0, 0, 2, 1), rectangle(0, 0.5, 1, 3)],
+                                              1e-6)
+        self.assertEqual(merged, [rectangle(5, 5, 6, 6), hfsstokicad.Path([0, 0, 2, 0, 2, 1, 1, 1, 1, 3, 0, 3])])
+        corner = [rectangle(0, 0, 1, 1), rectangle(1, 1, 2, 2)]
+        self.assertEqual(hfsstokicad.merge_rectangles(corner, 1e-6), corner)
+        ring = [rectangle(0, 0, 3, 1), rectangle(2, 0, 3, 3), rectangle(0, 2, 3, 3), rectangle(0, 0, 1, 3)]
+        self.assertEqual(hfsstokicad.merge_rectangles(ring, 1e-6), ring)
+        rotated = [hfsstokicad.Path([0, 0, 1, 1, 0, 2, -1, 1]), rectangle(0, 0, 1, 1)]
+        self.assertEqual(hfsstokicad.merge_rectangles(rotated, 1e-6), rotated)
+
+    def testSimplifiedFootprint(self):
+        source = sample_project().encode('utf-8')
+        footprint = hfsstokicad.convert(source, 'p')
+        hfsstokicad.set_options(simplify=0.001)
+        simplified = hfsstokicad.convert(source, 'p')
+        self.assertEqual(simplified.text.count('fp_poly'), footprint.text.count('fp_poly'))
+        self.assertLess(simplified.text.count('xy'), footprint.text.count('xy') / 10)
+        self.assertEqual(simplified.text.split('( xy')[0], footprint.text.split('( xy')[0])
+
+
+class ParserTest(unittest.TestCase):
+
+    def testEntries(self):
+        self.assertEqual(hfsstokicad.parse_entries("VariableProp('W2', 'UD', '', '1.5mm')"),
+                         [('VariableProp', ['W2', 'UD', '', '1.5mm'])])
+        self.assertEqual(hfsstokicad.parse_entries("TolVt(13.32, 14.56, 0, 5e-07)"),
+                         [('TolVt', [13.32, 14.56, 0, 5e-07])])
+        self.assertEqual(hfsstokicad.parse_entries("Name='max(dB(S(1,1)))'"), [('Name', 'max(dB(S(1,1)))')])
+        self.assertEqual(hfsstokicad.parse_entries("FacesIDs[2: 7, 8]"), [('FacesIDs', [7, 8])])
+        self.assertEqual(hfsstokicad.parse_entries("IsSuppressed=false"), [('IsSuppressed', False)])
+        self.assertEqual(hfsstokicad.parse_entries("Box(Name='a', Size=3)"), [('Box', {'Name': 'a', 'Size': 3})])
+        self.assertEqual(hfsstokicad.parse_entries("R3DWindowPos(Editor3d())"), [('R3DWindowPos', [{'Editor3d': []}])])
+
+    def testProject(self):
+        data = hfsstokicad.parse_project(sample_project().splitlines())
+        self.assertEqual(list(data.keys()), ['AnsoftProject'])
+        properties = data['AnsoftProject']['HFSSModel']['ModelSetup']['Properties']
+        self.assertEqual(hfsstokicad.get_variables(properties), {'W2': 1.5, 'Angle': '30deg'})
+        res, arcs, points = hfsstokicad.get_coordinates(data)
+        self.assertEqual(sorted(res.keys()), [0, 1])
+        self.assertEqual(res[0][1], [15.12, 14.56, 0, 5e-07])
+        self.assertEqual([arc.type for arc in arcs], ['line', 'arc', 'arc'])
+        self.assertEqual(arcs[2].angle, -30)
+        self.assertEqual(len(points), 3)
+
+    def testRepeated(self):
+        lines = ["$begin 'Block'", "TolVt(1, 2)", "$begin 'Edge'", "ID=1", "$end 'Edge'", "TolVt(3, 4)",
+                 "$begin 'Edge'", "ID=2", "$end 'Edge'", "Name='a'", "$end 'Block'"]
+        data = hfsstokicad.parse_project(lines)['Block']
+        self.assertIsInstance(data['TolVt'], hfsstokicad.Repeated)
+        self.assertEqual(data['TolVt'], [[1, 2], [3, 4]])
+        self.assertEqual(hfsstokicad.items_of(data, 'Edge'), [{'ID': 1}, {'ID': 2}])
+        self.assertEqual(hfsstokicad.items_of(data, 'Name'), ['a'])
+        self.assertEqual(hfsstokicad.items_of(data, 'Face'), [])
+        data = hfsstokicad.json.loads('{"Edge": {"ID": 1}, "Edge": {"ID": 2}}',
+                                      object_pairs_hook=hfsstokicad.collect_pairs)
+        self.assertEqual(hfsstokicad.items_of(data, 'Edge'), [{'ID': 1}, {'ID': 2}])
+
+    def testSelectedBlocks(self):
+        data = hfsstokicad.parse_project(sample_project().splitlines(), hfsstokicad.geometry_blocks)
+        project = data['AnsoftProject']
+        self.assertEqual(project['Created'], 'Wed Jun 13 10:56:15 2018')
+        self.assertNotIn('Desktop', project)
+        self.assertEqual(list(project['HFSSModel'].keys()), ['Name', 'ModelSetup'])
+        self.assertEqual(list(project['HFSSModel']['ModelSetup'].keys()), ['Properties', 'GeometryCore'])
+        full = hfsstokicad.parse_project(sample_project().splitlines())
+        self.assertEqual(project['HFSSModel']['ModelSetup']['GeometryCore'],
+                         full['AnsoftProject']['HFSSModel']['ModelSetup']['GeometryCore'])
+
+    def testLazyProject(self):
+        text = sample_project()
+        with hfsstokicad.LazyProject(text.encode('utf-8')) as project:
+            self.assertEqual(project.select(hfsstokicad.geometry_blocks),
+                             hfsstokicad.parse_project(text.splitlines(), hfsstokicad.geometry_blocks))
+            self.assertEqual(project.get('AnsoftProject/HFSSModel/ModelSetup/Properties'),
+                             {'VariableProp': [['W2', 'UD', '', '1.5mm'], ['Angle', 'UD', '', '30deg']]})
+            self.assertEqual([b.name for b in project.block('AnsoftProject/HFSSModel').blocks()],
+                             ['ModelSetup', 'ReportSetup'])
+            self.assertEqual(project.block('AnsoftProject').attributes(), {'Created': 'Wed Jun 13 10:56:15 2018'})
+            self.assertRaises(KeyError, project.get, 'AnsoftProject/Solutions')
+        lines = ["$begin 'Block'", "A=1", "$begin 'Block'", "B=$begin_cdata$", "$end 'Block'", "$end_cdata$",
+                 "$end 'Block'", "C=2", "$end 'Block'", "$begin 'Other'", "$end 'Other'"]
+        project = hfsstokicad.LazyProject("\n".join(lines).encode('utf-8'))
+        self.assertEqual([b.name for b in project.blocks()], ['Block', 'Other'])
+        self.assertEqual(project.get('Block'), hfsstokicad.parse_project(lines)['Block'])
+
+    def testReadProjectText(self):
+        text = sample_project()
+        section = text[:text.index("$end 'AnsoftProject'") + len("$end 'AnsoftProject'")]
+        self.assertEqual(hfsstokicad.read_project_text(text.encode('utf-8')), section)
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'sample.hfss')
+            with open(filename, 'w', newline='\r\n') as f:
+                f.write(text)
+            self.assertEqual(hfsstokicad.read_project_text(filename), section)
+            with open(filename, 'w') as f:
+                pass
+            self.assertEqual(hfsstokicad.read_project_text(filename), '')
+        finally:
+            shutil.rmtree(folder)
+
+    def testSameAsJson(self):
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'sample.hfss')
+            with open(filename, 'w') as f:
+                f.write(sample_project())
+            outputs = []
+            for legacy in [True, False]:
+                self.assertTrue(hfsstokicad.main(filename, legacy=legacy))
+                with open(os.path.join(folder, 'sample.kicad_mod')) as f:
+                    outputs.append(f.read())
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(sorted(os.listdir(folder)),
+                             ['sample.hfss', 'sample.kicad_mod', 'sample_inverted.kicad_mod'])
+        finally:
+            shutil.rmtree(folder)
+
+    def testConvertSources(self):
+        text = sample_project()
+        footprint = hfsstokicad.convert(text.encode('utf-8'), name='sample')
+        self.assertEqual(footprint.name, 'sample')
+        self.assertTrue(footprint.text.startswith('(module sample\n'))
+        self.assertIn('(xy -13.320000 14.560000)', footprint.inverted_text)
+        self.assertEqual(hfsstokicad.convert(io.StringIO(text), name='sample'), footprint)
+        self.assertEqual(hfsstokicad.convert(io.BytesIO(text.encode('utf-8')), name='sample', legacy=True), footprint)
+        stream = io.BytesIO(text.encode('utf-8'))
+        stream.read = None  # file objects are streamed line by line, not read whole
+        self.assertEqual(hfsstokicad.convert(stream, name='sample'), footprint)
+
+
+class DesignTest(unittest.TestCase):
+
+    def tearDown(self):
+        hfsstokicad.set_options()
+
+    def testDesigns(self):
+        source = two_design_project().encode('utf-8')
+        for legacy in [False, True]:
+            footprints = hfsstokicad.convert_all(source, 'p', legacy=legacy)
+            self.assertEqual([f.name for f in footprints], ['p_HFSSDesign1', 'p_Design_2'])
+            self.assertEqual(footprints[0].text.replace('p_HFSSDesign1', 'p'),
+                             hfsstokicad.convert(sample_project().encode('utf-8'), 'p').text)
+            self.assertEqual(footprints[1].text.count('fp_poly'), 3)
+        footprints = hfsstokicad.convert_all(source, 'p', designs=['Design*'], parts=['Pad', 'Polyline2'])
+        self.assertEqual([f.text.count('fp_poly') for f in footprints], [2])
+        footprints = hfsstokicad.convert_all(source, 'p', designs=['Design*'], split=True)
+        self.assertEqual([f.name for f in footprints], ['p_Design_2_Pad', 'p_Design_2_Polyline1',
+                                                        'p_Design_2_Polyline2', 'p_Design_2_Rectangle2'])
+        self.assertRaises(KeyError, hfsstokicad.convert_all, source, 'p', designs=['Other'])
+
+    def testArcIndexes(self):
+        data = hfsstokicad.parse_project(two_design_project().splitlines())
+        design = hfsstokicad.get_designs(data)[1]
+        res, arcs, points = hfsstokicad.get_design_coordinates(design)
+        self.assertEqual(len(points), 6)
+        self.assertEqual([arc.startindex for arc in arcs], [0, 1, 2, 3, 4, 5])
+        res, arcs, points = hfsstokicad.get_design_coordinates(design, 'Polyline2'.__eq__)
+        self.assertEqual(([arc.startindex for arc in arcs], list(res.keys())), ([0, 1, 2], []))
+
+    def testParametersHook(self):
+        calls = []
+        data = hfsstokicad.parse_project(sample_project().splitlines())
+        hfsstokicad.parameters_hook = lambda parameters, points: calls.append(len(points))
+        hfsstokicad.get_coordinates(data)
+        self.assertEqual(calls, [3])
+        hfsstokicad.set_options(parameters=False)
+        self.assertIsNone(hfsstokicad.parameters_hook)
+        hfsstokicad.get_coordinates(data)
+        self.assertEqual(calls, [3])
+
+    def testParametersHookParts(self):
+        def move(parameters, points):
+            points[4].x = 9
+        hfsstokicad.parameters_hook = move
+        design = hfsstokicad.get_designs(hfsstokicad.parse_project(two_design_project().splitlines()))[1]
+        res, arcs, points = hfsstokicad.get_design_coordinates(design)
+        res, arcs, selected = hfsstokicad.get_design_coordinates(design, 'Polyline2'.__eq__)
+        self.assertEqual(points[4].x, 9)
+        self.assertEqual(list(selected), list(points)[3:])
+
+
+class SweepTest(unittest.TestCase):
+
+    def testExpression(self):
+        self.assertEqual(hfsstokicad.Expression('2*W2 + 500um').names, {'W2'})
+        self.assertAlmostEqual(hfsstokicad.Expression('2*W2 + 500um')({'W2': 1.5}), 3.5)
+        self.assertAlmostEqual(hfsstokicad.Expression('W*cos(-Angle) - 0.1rad/pi')({'W': 2, 'Angle': 60}),
+                               1 - 18 / math.pi ** 2)
+        self.assertAlmostEqual(hfsstokicad.Expression('2^3 + 1e-3mm')({}), 8.001)
+        self.assertRaises(KeyError, hfsstokicad.Expression('X + 1'), {})
+        self.assertRaises(ValueError, hfsstokicad.Expression, '1 +')
+        self.assertRaises(ValueError, hfsstokicad.Expression('open(1)'), {})
+        self.assertRaises(hfsstokicad.ExpressionError, hfsstokicad.Expression('1/(W2 - 1.5mm)'), {'W2': 1.5})
+        self.assertRaises(hfsstokicad.ExpressionError, hfsstokicad.Expression('sqrt(-1)'), {})
+        self.assertEqual(hfsstokicad.evaluate_variables({'W2': '1.5mm', 'W3': 'W2*2', 'A': 'B', 'B': 'A', 'S': '"a"'}),
+                         {'W2': 1.5, 'W3': 3})
+
+    def testTemplate(self):
+        text = sample_project()
+        template = hfsstokicad.load_templates(text.encode('utf-8'), 'p')[0]
+        self.assertEqual(template.variables, {'W2': '1.5mm', 'Angle': '30deg'})
+        self.assertEqual(template.users, {'Angle': ([], [2])})
+        self.assertEqual(template.footprint(), hfsstokicad.convert(text.encode('utf-8'), 'p'))
+        self.assertEqual(template.footprint({'Angle': '45deg'}, 'q'),
+                         hfsstokicad.convert(text.replace("'30deg'", "'45deg'").encode('utf-8'), 'q'))
+        self.assertEqual(template.footprint({'W2': 1.7}).text, template.footprint({'W2': '1700um'}).text)
+        self.assertRaises(KeyError, template.footprint, {'W5': 1})
+        self.assertEqual(template.footprint({'Angle': 45}), template.footprint({'Angle': '45deg'}))
+        self.assertRaises(hfsstokicad.ExpressionError, template.footprint, {'Angle': '45 degrees'})
+        calls = []
+        hfsstokicad.parameters_hook = lambda parameters, points: calls.append(parameters)
+        try:
+            template.footprint({'Angle': 'W2*20', 'W2': 2})
+            template.footprint({'Angle': '0.5rad'})
+        finally:
+            hfsstokicad.set_options()
+        self.assertEqual(calls[0], {'Angle': '40.0deg', 'W2': 2.0})
+        self.assertEqual(float(calls[1]['Angle'].replace('deg', '')), 0.5 / math.pi * 180)
+        self.assertEqual(calls[1]['W2'], 1.5)
+        self.assertEqual([t.name for t in hfsstokicad.load_templates(two_design_project().encode('utf-8'), 'p')],
+                         ['p_HFSSDesign1', 'p_Design_2'])
+
+    def testParametersHook(self):
+        text = hook_project()
+        template = hfsstokicad.load_templates(text.encode('utf-8'), 'p')[0]
+        self.assertEqual(template.angles, {'Angle'})
+        for values, replaced in [({'W2': '2mm'}, "'W2', 'UD', '', '2mm'"), ({'W2': 2}, "'W2', 'UD', '', '2mm'"),
+                                 ({'Angle': 45}, "'Angle', 'UD', '', '45deg'"),
+                                 ({'Angle': '0.5rad'}, "'Angle', 'UD', '', '%rdeg'" % (0.5 / math.pi * 180))]:
+            old = "'%s', 'UD', '', '%s'" % (list(values)[0], template.variables[list(values)[0]])
+            footprint = template.footprint(values, 'q')
+            self.assertNotEqual(footprint, template.footprint(name='q'))
+            self.assertEqual(footprint, hfsstokicad.convert(text.replace(old, replaced).encode('utf-8'), 'q'))
+        self.assertEqual(template.footprint({'X02': '7mm'}).geometry.polyline[0].x, 7 + 1.5)
+        hfsstokicad.parameters_hook = lambda parameters, points: parameters['W2'][:4]
+        try:
+            self.assertRaises(ValueError, template.footprint, {'W2': '2mm'})
+        finally:
+            hfsstokicad.set_options()
+
+    def testRectangles(self):
+        operation = ("$begin 'Operation'\nOperationType='Rectangle'\nID=4\n$begin 'RectangleParameters'\n"
+                     "XStart='1mm'\nYStart='-W2'\nZStart='0mm'\nWidth='W2'\nHeight='2*W2'\nWhichAxis='Z'\n"
+                     "$end 'RectangleParameters'\n$end 'Operation'\n")
+
+        def project(w2: float, operations: str = operation) -> str:
+            part = RECTANGLE % ('Rectangle2', 1, -w2, 1 + w2, -w2, 1 + w2, w2, 1, w2)
+            part = part.replace("$begin 'Operations'\n", "$begin 'Operations'\n" + operations)
+            return sample_project().replace(RECTANGLE % ('Rectangle2', 1, 2, 3, 2, 3, 4, 1, 4), part).replace(
+                "'W2', 'UD', '', '1.5mm'", "'W2', 'UD', '', '%smm'" % w2)
+
+        template = hfsstokicad.load_templates(project(1.5).encode('utf-8'), 'p')[0]
+        self.assertEqual(template.rectangle_users, {'W2': [1]})
+        self.assertEqual(template.footprint({'W2': 2}), hfsstokicad.convert(project(2).encode('utf-8'), 'p'))
+        moved = operation + operation.replace("'Rectangle'", "'Move'").replace("'RectangleParameters'", "'Move'")
+        template = hfsstokicad.load_templates(project(1.5, moved).encode('utf-8'), 'p')[0]
+        self.assertRaises(hfsstokicad.ExpressionError, template.footprint, {'W2': 2})
+        self.assertEqual(template.footprint({'Angle': 45}).text, template.footprint({'Angle': '45deg'}).text)
+
+    def testSweepFiles(self):
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'sample.hfss')
+            with open(filename, 'w') as f:
+                f.write(sample_project())
+            sweep = os.path.join(folder, 'sweep.csv')
+            with open(sweep, 'w') as f:
+                f.write("Angle, W2\n30deg, 1.5mm\n45deg,\n60,\nW2*20, 2\n")
+            self.assertEqual(hfsstokicad.read_sweep(sweep), [{'Angle': '30deg', 'W2': '1.5mm'}, {'Angle': '45deg'},
+                                                           {'Angle': '60'}, {'Angle': 'W2*20', 'W2': '2'}])
+            self.assertTrue(hfsstokicad.main(filename, sweep=sweep))
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                self.assertFalse(hfsstokicad.main(filename, sweep=os.path.join(folder, 'missing.csv')))
+            self.assertEqual(output.getvalue(), "File %s not found\n" % os.path.join(folder, 'missing.csv'))
+            self.assertEqual(sorted(f for f in os.listdir(folder) if f.endswith('.kicad_mod')),
+                             ['sample_1.kicad_mod', 'sample_1_inverted.kicad_mod',
+                              'sample_2.kicad_mod', 'sample_2_inverted.kicad_mod',
+                              'sample_3.kicad_mod', 'sample_3_inverted.kicad_mod',
+                              'sample_4.kicad_mod', 'sample_4_inverted.kicad_mod'])
+        finally:
+            shutil.rmtree(folder)
+
+
+class WatchTest(FolderTest):
+
+    def setUp(self):
+        super().setUp()
+        self.mtime = 0
+
+    def save(self, text: str):
+        with open(self.filename, 'w') as f:
+            f.write(text)
+        self.mtime += 10 ** 9
+        os.utime(self.filename, ns=(self.mtime, self.mtime))
+
+    def testWatch(self):
+        watcher = hfsstokicad.Watcher([self.folder], debounce=1)
+        self.assertEqual(watcher.poll(0), [])
+        self.save(sample_project())
+        self.assertEqual(watcher.poll(0), [])
+        res = watcher.poll(1)
+        self.assertEqual([(r.ok, r.footprints) for r in res], [(True, [os.path.join(self.folder, 'sample')])])
+        state = watcher.files[self.filename]
+        self.assertEqual((state.tessellation.hits, state.tessellation.misses), (0, 3))
+        self.assertEqual(watcher.poll(2), [])
+        started = hfsstokicad.Watcher([self.filename], debounce=1)
+        self.assertEqual([r.footprints for r in started.poll(0)], [[os.path.join(self.folder, 'sample')]])
+        self.save(sample_project())
+        self.assertEqual(watcher.poll(10), [])
+        self.assertEqual(watcher.poll(10.5), [])
+        self.assertEqual(watcher.poll(11), [])
+        self.save(sample_project().replace("'W2', 'UD', '', '1.5mm'", "'W2', 'UD', '', '2mm'"))
+        self.assertEqual(watcher.poll(20), [])
+        self.assertEqual([(r.ok, r.footprints) for r in watcher.poll(21)], [(True, [])])
+        self.save(sample_project().replace("'30deg'", "'45deg'"))
+        self.assertEqual(watcher.poll(30), [])
+        res = watcher.poll(31.5)
+        self.assertEqual([(r.ok, r.footprints) for r in res], [(True, [os.path.join(self.folder, 'sample')])])
+        self.assertEqual((state.tessellation.hits, state.tessellation.misses), (3 + 2, 3 + 1))
+        with open(os.path.join(self.folder, 'sample.kicad_mod')) as f:
+            self.assertEqual(f.read(), hfsstokicad.convert(self.filename).text)
+        self.save("$begin 'AnsoftProject'\n$end 'AnsoftProject'\n")
+        self.assertEqual(watcher.poll(40), [])
+        self.assertEqual([r.ok for r in watcher.poll(41)], [False])
+        os.remove(self.filename)
+        self.assertEqual(watcher.poll(50), [])
+        self.assertEqual(watcher.files, {})
+
+
+class BatchTest(FolderTest):
+
+    def setUp(self):
+        super().setUp()
+        for name in ['b.hfss', 'a.aedt']:
+            with open(os.path.join(self.folder, name), 'w') as f:
+                f.write(sample_project())
+        with open(os.path.join(self.folder, 'broken.hfss'), 'w') as f:
+            f.write("$begin 'AnsoftProject'\n$end 'AnsoftProject'\n")
+        with open(os.path.join(self.folder, 'notes.txt'), 'w') as f:
+            f.write("not a project")
+
+    def testFindProjects(self):
+        names = [os.path.basename(f) for f in hfsstokicad.find_projects([self.folder])]
+        self.assertEqual(names, ['a.aedt', 'b.hfss', 'broken.hfss'])
+        names = hfsstokicad.find_projects([os.path.join(self.folder, 'b*'), os.path.join(self.folder, 'b.hfss')])
+        self.assertEqual([os.path.basename(f) for f in names], ['b.hfss', 'broken.hfss'])
+
+    def testConvertFiles(self):
+        filenames = hfsstokicad.find_projects([self.folder])
+        for jobs in [1, 2]:
+            results = hfsstokicad.convert_files(filenames, jobs=jobs)
+            self.assertEqual([r.filename for r in results], filenames)
+            self.assertEqual([r.ok for r in results], [True, True, False])
+            self.assertIn('KeyError', results[2].error)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, 'a_inverted.kicad_mod')))
+
+    def testCommandLine(self):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hfsstokicad.py')
+        res = subprocess.run([sys.executable, script, '--no-cache', '--jobs', '2', self.folder],
+                             capture_output=True, text=True)
+        self.assertEqual(res.returncode, 1)
+        self.assertIn('3 files: 2 converted, 1 failed', res.stdout)
+        res = subprocess.run([sys.executable, script, '--no-cache', os.path.join(self.folder, 'a.aedt')],
+                             capture_output=True)
+        self.assertEqual(res.returncode, 0)
+        for option in ['--tolerance=0', '--tolerance=-0.01', '--max-arc-points=0', '--simplify=-1']:
+            res = subprocess.run([sys.executable, script, option, os.path.join(self.folder, 'a.aedt')],
+                                 capture_output=True, text=True)
+            self.assertEqual(res.returncode, 2)
+            self.assertIn('must be positive', res.stderr)
+
+    def testProfile(self):
+        hfsstokicad.set_profiling()
+        try:
+            results = hfsstokicad.convert_files(hfsstokicad.find_projects([self.folder]), jobs=2)
+            self.assertEqual([r.ok for r in results], [True, True, False])
+            self.assertEqual([s['name'] for s in results[0].profile],
+                             ['parse', 'geometry', 'tessellate', 'format', 'write'])
+            stages = hfsstokicad.stages
+            self.assertGreater(stages['parse'].counts['lines'], 100)
+            self.assertEqual(stages['geometry'].counts, {'parts': 4, 'arcs': 4, 'points': 6})
+            self.assertEqual(stages['tessellate'].counts['points'] + 16, stages['format'].counts['points'])
+            self.assertEqual(stages['write'].calls, 2)
+            self.assertGreater(stages['parse'].peak, 0)
+            filename = os.path.join(self.folder, 'profile.json')
+            hfsstokicad.write_profile(filename, results)
+            with open(filename) as f:
+                report = hfsstokicad.json.load(f)
+            self.assertEqual(report['stages'], hfsstokicad.profile_report())
+            self.assertEqual(len(report['files']), 3)
+        finally:
+            hfsstokicad.set_profiling(False)
+        with hfsstokicad.stage('parse') as res:
+            res.count(lines=1)
+        self.assertEqual(hfsstokicad.stages, {})
+
+
+class OutputTest(SampleFolderTest):
+
+    def testFormats(self):
+        formats = ['kicad_mod', 'json', 'svg'] + (['npz'] if hfsstokicad.np is not None else [])
+        hfsstokicad.set_options(formats=formats)
+        self.assertTrue(hfsstokicad.main(self.filename))
+        name = os.path.join(self.folder, 'sample')
+        self.assertEqual(sorted(os.listdir(self.folder)),
+                         sorted(['sample.hfss'] + [os.path.basename(f) for f in hfsstokicad.output_files(name)]))
+        footprint = hfsstokicad.convert(self.filename)
+        with open(name + '.kicad_mod') as f:
+            self.assertEqual(f.read(), footprint.text)
+        with open(name + '.json') as f:
+            self.assertEqual(hfsstokicad.footprint_from_dict(hfsstokicad.json.load(f)), footprint)
+        with open(name + '.svg') as f:
+            self.assertEqual(f.read().count('<polygon '), footprint.text.count('fp_poly'))
+        if hfsstokicad.np is not None:
+            data = hfsstokicad.np.load(name + '.npz')
+            self.assertEqual(data['polyline'].shape, (len(footprint.geometry.polyline), 2))
+            self.assertEqual(list(data['rectangle_sizes']), [4, 4])
+            self.assertEqual(data['rectangles'][4].tolist(), list(footprint.geometry.rectangles[1][0]))
+
+    def testFormatOptions(self):
+        self.assertRaises(ValueError, hfsstokicad.set_options, formats=['dxf'])
+        np, hfsstokicad.np = hfsstokicad.np, None
+        try:
+            self.assertRaises(ValueError, hfsstokicad.set_options, formats=['kicad_mod', 'npz'])
+        finally:
+            hfsstokicad.np = np
+        self.assertEqual(hfsstokicad.selected_formats, hfsstokicad.default_formats)
+        self.assertIsNot(hfsstokicad.selected_formats, hfsstokicad.default_formats)
+
+    def testCachedGeometry(self):
+        cache = hfsstokicad.Cache(os.path.join(self.folder, 'cache'))
+        hfsstokicad.convert_to_files(self.filename, cache=cache)
+        name = hfsstokicad.source_name(self.filename)
+        self.assertEqual(cache.get(cache.key(self.filename, name)), [hfsstokicad.convert(self.filename)])
+        hfsstokicad.set_options(formats=['svg'])
+        self.assertEqual(hfsstokicad.convert_to_files(self.filename, cache=cache), ([name], True))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, 'sample.svg')))
+
+
+class ServeTest(SampleFolderTest):
+
+    def start(self, server: hfsstokicad.Server) -> threading.Thread:
+        thread = threading.Thread(target=server.run, args=('127.0.0.1', 0))
+        thread.start()
+        self.assertTrue(server.started.wait(30))
+        return thread
+
+    def request(self, server: hfsstokicad.Server, method: str, url: str, body=None, headers=None):
+        connection = http.client.HTTPConnection(*server.address, timeout=30)
+        try:
+            connection.request(method, url, body, headers or {})
+            response = connection.getresponse()
+            return response.status, hfsstokicad.json.loads(response.read())
+        finally:
+            connection.close()
+
+    def testServe(self):
+        server = hfsstokicad.Server(jobs=1)
+        thread = self.start(server)
+        try:
+            status, res = self.request(server, 'POST', '/convert', hfsstokicad.json.dumps({'path': self.filename}),
+                                       {'Content-Type': 'application/json'})
+            self.assertEqual((status, res['ok'], res['footprints']), (200, True, [self.filename[:-5]]))
+            self.assertEqual(set(res['time']), {'queue', 'convert', 'total'})
+            self.assertTrue(all(os.path.exists(f) for f in res['files']))
+            status, res = self.request(server, 'POST', '/convert?name=p', sample_project().encode('utf-8'))
+            self.assertEqual(status, 200)
+            self.assertEqual(res['footprints'][0]['formats']['kicad_mod'],
+                             hfsstokicad.convert(sample_project().encode('utf-8'), 'p').text)
+            status, res = self.request(server, 'POST', '/convert', hfsstokicad.json.dumps({'path': 'none.hfss'}),
+                                       {'Content-Type': 'application/json'})
+            self.assertEqual((status, res['ok']), (422, False))
+            self.assertEqual(self.request(server, 'POST', '/convert', '{', {'Content-Type': 'application/json'})[0],
+                             400)
+            self.assertEqual(self.request(server, 'GET', '/other')[0], 404)
+            status, res = self.request(server, 'GET', '/status')
+            self.assertEqual((res['done'], res['failed'], res['active'], res['waiting']), (2, 1, 0, 0))
+        finally:
+            server.stop()
+            thread.join(30)
+        self.assertFalse(thread.is_alive())
+
+    def testQueueLimit(self):
+        server = hfsstokicad.Server(jobs=1, max_queue=0)
+        thread = self.start(server)
+        try:
+            status, res = self.request(server, 'POST', '/convert', sample_project().encode('utf-8'))
+            self.assertEqual((status, res['error']), (503, 'queue is full'))
+            self.assertEqual(self.request(server, 'GET', '/status')[1]['rejected'], 1)
+        finally:
+            server.stop()
+            thread.join(30)
+
+
+class CacheTest(SampleFolderTest):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = hfsstokicad.Cache(os.path.join(self.folder, 'cache'))
+
+    def testCache(self):
+        self.assertEqual(hfsstokicad.convert_to_files(self.filename, cache=self.cache)[1], False)
+        output = os.path.join(self.folder, 'sample.kicad_mod')
+        with open(output) as f:
+            text = f.read()
+        os.remove(output)
+        self.assertEqual(hfsstokicad.convert_to_files(self.filename, cache=self.cache)[1], True)
+        with open(output) as f:
+            self.assertEqual(f.read(), text)
+        hfsstokicad.set_options(tolerance=0.01)
+        self.assertEqual(hfsstokicad.convert_to_files(self.filename, cache=self.cache)[1], False)
+        self.assertEqual(len(os.listdir(self.cache.folder)), 2)
+        with open(self.filename, 'a') as f:
+            f.write('\n')
+        self.assertEqual(hfsstokicad.convert_to_files(self.filename, cache=self.cache)[1], False)
+
+    def testEviction(self):
+        self.cache.size = 1
+        hfsstokicad.convert_to_files(self.filename, cache=self.cache)
+        self.assertEqual(os.listdir(self.cache.folder), [])
+        self.cache.size = 10 ** 6
+        for tolerance in [0.1, 0.01, 0.001]:
+            hfsstokicad.set_options(tolerance=tolerance)
+            hfsstokicad.convert_to_files(self.filename, cache=self.cache)
+            time.sleep(0.01)
+        entries = sorted(os.listdir(self.cache.folder),
+                         key=lambda e: os.path.getmtime(os.path.join(self.cache.folder, e)))
+        sizes = [sum(os.path.getsize(os.path.join(self.cache.folder, e, f))
+                     for f in os.listdir(os.path.join(self.cache.folder, e))) for e in entries]
+        self.cache.size = sum(sizes[1:])
+        self.cache.evict()
+        self.assertEqual(sorted(os.listdir(self.cache.folder)), sorted(entries[1:]))
+
+
+class BenchmarkTest(FolderTest):
+
+    def testSyntheticProject(self):
+        project = benchmark.SyntheticProject(100000, geometry_share=0.2, segments=6)
+        filename = benchmark.get_project(self.folder, project)
+        self.assertAlmostEqual(os.path.getsize(filename), 100000, delta=10000)
+        self.assertEqual(benchmark.get_project(self.folder, project), filename)
+        footprint = hfsstokicad.convert(filename)
+        self.assertEqual(hfsstokicad.convert(filename, legacy=True), footprint)
+        result = benchmark.run_benchmark(filename)
+        self.assertTrue(result['ok'])
+        stages = {s['name']: s for s in result['stages']}
+        self.assertEqual(stages['tessellate']['counts']['arcs'], 3 * (stages['geometry']['counts']['parts'] // 10))
+        self.assertGreater(result['throughput'], 0)
+        self.assertFalse(hfsstokicad.profiling)
+        project = benchmark.SyntheticProject(100000, geometry_share=0.2, segments=6, embedded_share=0.5)
+        filename = benchmark.get_project(self.folder, project)
+        self.assertEqual(hfsstokicad.convert(filename, legacy=True), hfsstokicad.convert(filename))
+        self.assertLess(len(hfsstokicad.read_project_text(filename)), 60000)
+
+
+class RegressionTest(FolderTest):
+
+    def testGoldenOutputs(self):
+        for res in regression.run_corpus(legacy=True, data_folder=self.folder):
+            self.assertEqual(res['error'], '', res['name'])
+            self.assertEqual(res['vertices'], res['golden_vertices'])
+
+    def testCompare(self):
+        sample = regression.corpus[0]
+        filename = benchmark.get_project(self.folder, sample.project)
+        text = hfsstokicad.convert(filename).text
+        golden = regression.normalize(text)
+        self.assertEqual(regression.normalize(text.replace(sample.name, 'other')), golden)
+        self.assertEqual(regression.compare(golden, regression.normalize(text), 1e-6), '')
+        moved = [[c + 1e-6 for c in polygon] for polygon in golden]
+        self.assertEqual(regression.compare(golden, moved, 2e-6), '')
+        self.assertIn('vertex 0', regression.compare(golden, moved, 1e-7))
+        self.assertIn('vertices', regression.compare(golden, [golden[0][2:]] + golden[1:], 1e-6))
+        self.assertIn('polygons', regression.compare(golden, golden[1:], 1e-6))
+        self.assertEqual(regression.mirror(regression.mirror(golden)), golden)
+        res = regression.check_sample(sample, self.folder, self.folder)
+        self.assertEqual(res['error'], 'golden output not found')
+        res = regression.check_sample(sample, self.folder, self.folder, update=True)
+        self.assertEqual(res['error'], '')
+        self.assertEqual(regression.load_golden(self.folder, sample)['polygons'], golden)
+
+
 if __name__ == '__main__':
     unittest.main()